@@ -0,0 +1,311 @@
+import argparse
+import hashlib
+import json
+from multiprocessing import Pool
+import os
+import time
+
+import numpy as np
+
+from batch import simulate_throws
+from game import course_from_info
+from physics import Disc
+
+
+ANALYSIS_VERSION = 4
+# Every move is swept, so a coarser step than play uses lands within a
+# metre of the same spots at a quarter of the steps.
+ANALYSIS_DT = 1 / 15
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'disc-golf-course-creator', 'analysis')
+
+
+def analysis_disc():
+    # The disc every player in main.py throws.
+    return Disc(0, 0, 0.12, (255, 0, 0), 7, 5, -2, 1)
+
+
+class PowerTable:
+    # How far each power carries the disc with nothing in the way, and how
+    # far off the aim the turn and fade leave it, to pick throws from.
+    # Lines are tried at every angle of fan off the basket, at each
+    # fraction of the way there in layups, and at the firm powers.
+    def __init__(
+        self,
+        disc,
+        powers=np.arange(1, 101),
+        dt=ANALYSIS_DT,
+        fan=np.linspace(-.9, .9, 13),
+        layups=(1, .5),
+        firm=(100,),
+        tree_penalty=5,
+        ignore_time=.55
+    ):
+        result = simulate_throws(0, 0, 0, powers, disc, dt=dt)
+        self.powers = np.asarray(powers, dtype=np.float64)
+        self.carry = np.maximum.accumulate(np.hypot(result.x, result.y))
+        self.drift = np.arctan2(result.y, result.x)
+        self.fan = np.asarray(fan, dtype=np.float64)
+        self.layups = np.asarray(layups, dtype=np.float64)
+        self.firm = np.searchsorted(self.powers, firm)
+        self.tree_penalty = tree_penalty
+        self.ignore_time = ignore_time
+
+    def plan(self, x, y, basket, disc, forest, resting_on_tree, dt):
+        # Absolute angles and powers of the line each lie is best played
+        # on. The softest throw that carries a line's distance is used,
+        # since the basket catches the disc on the way past, and the aim
+        # allows for the drift. With no trees that's the line straight at
+        # the basket. Otherwise every line is flown without glancing off
+        # trees, scoring how far it leaves the disc from the basket plus
+        # tree_penalty metres if it touches a tree, and the best is played.
+        # A disc resting on a tree is taken to ignore it for ignore_time,
+        # about as long as it does on average. Players at the same lie, as
+        # every player is on the tee, are planned for once.
+        distance = np.hypot(basket.x - x, basket.y - y)
+        bearing = np.arctan2(basket.y - y, basket.x - x)
+        if forest is None:
+            index = np.minimum(np.searchsorted(self.carry, distance), len(self.powers) - 1)
+            return (bearing - self.drift[index], self.powers[index])
+
+        (_, first, lie) = np.unique(np.stack([x, y], axis=1), axis=0, return_index=True, return_inverse=True)
+        lie = lie.reshape(-1)
+        (x, y, distance, bearing) = (x[first], y[first], distance[first], bearing[first])
+        index = np.concatenate([
+            np.searchsorted(self.carry, distance[:, None] * self.layups),
+            np.broadcast_to(self.firm, (len(first), len(self.firm)))
+        ], axis=1)
+        index = np.minimum(index, len(self.powers) - 1)[:, None, :]
+
+        angles = bearing[:, None, None] - self.drift[index] + self.fan[:, None]
+        powers = np.broadcast_to(self.powers[index], angles.shape)
+        invincible = (resting_on_tree[first][:, None, None], 0, self.ignore_time)
+        result = simulate_throws(
+            x[:, None, None], y[:, None, None], angles, powers, disc, forest, basket, dt, invincible=invincible
+        )
+
+        left = np.where(result.in_basket, 0, np.hypot(result.x - basket.x, result.y - basket.y))
+        cost = (left + np.where(result.tree_hit, self.tree_penalty, 0)).reshape(len(first), -1)
+        best = (np.arange(len(first)), np.argmin(cost, axis=1))
+        return (angles.reshape(len(first), -1)[best][lie], powers.reshape(len(first), -1)[best][lie])
+
+
+def play_hole(hole, forest, table, disc, players, rng, max_throws, angle_error, power_error, dt):
+    # Strokes for each of players playing the hole side by side, which of
+    # them finished it, and the number of throws that touched a tree. Each
+    # throw misses the line planned for it by angle_error and power_error,
+    # and discs glance off trees at random as in play. Players still out
+    # after max_throws are capped there.
+    x = np.full(players, float(hole.tee_pad.x))
+    y = np.full(players, float(hole.tee_pad.y))
+    strokes = np.full(players, max_throws)
+    playing = np.ones(players, dtype=bool)
+    throws = 0
+    tree_hits = 0
+
+    for throw in range(1, max_throws + 1):
+        if not playing.any():
+            break
+
+        # A disc resting against a tree in play keeps glancing off it and
+        # ignoring it in turn, so it's nearly always thrown while ignoring
+        # it, as if it had just glanced off.
+        count = int(playing.sum())
+        resting_on_tree = np.zeros(count, dtype=bool)
+        if forest is not None:
+            resting_on_tree = forest.impacts(x[playing], y[playing], np.zeros(count), np.zeros(count), disc.radius) == 0
+
+        (angles, powers) = table.plan(x[playing], y[playing], hole.basket, disc, forest, resting_on_tree, dt)
+        angles = angles + rng.normal(0, angle_error, count)
+        powers = np.clip(powers * (1 + rng.normal(0, power_error, count)), 1, 100)
+        invincible = (resting_on_tree, 0, rng.uniform(.1, 1, count))
+        result = simulate_throws(
+            x[playing], y[playing], angles, powers, disc, forest, hole.basket, dt, rng=rng, invincible=invincible
+        )
+        throws += count
+        tree_hits += int(result.tree_hit.sum())
+
+        x[playing] = result.x
+        y[playing] = result.y
+        holed = np.flatnonzero(playing)[result.in_basket]
+        strokes[holed] = throw
+        playing[holed] = False
+
+    return (strokes, ~playing, throws, tree_hits)
+
+
+worker_course = None
+
+
+def start_worker(course_info):
+    # Each worker lays the course out itself rather than being sent it.
+    global worker_course
+    worker_course = course_from_info(course_info)
+
+
+def analyze_hole(task):
+    (index, players, seed, max_throws, angle_error, power_error, dt) = task
+    hole = worker_course.holes[index]
+    disc = analysis_disc()
+    table = PowerTable(disc, dt=dt)
+
+    rng = np.random.default_rng([seed, hole.number])
+    (strokes, finished, throws, tree_hits) = play_hole(
+        hole, worker_course.forest, table, disc, players, rng, max_throws, angle_error, power_error, dt
+    )
+    # The same players with no trees, to tell what the trees add.
+    (open_strokes, _, _, _) = play_hole(
+        hole, None, table, disc, players, rng, max_throws, angle_error, power_error, dt
+    )
+
+    # Only the players who finished say how many throws the hole takes.
+    # The rest are counted separately, rather than at the throws they were
+    # capped at.
+    finished_strokes = strokes[finished]
+    open_mean_strokes = float(open_strokes.mean())
+    finished_rate = float(finished.mean())
+    summary = {'mean_strokes': None, 'p10_strokes': None, 'p50_strokes': None, 'p90_strokes': None, 'difficulty': None}
+    if len(finished_strokes) > 0:
+        summary = {
+            'mean_strokes': float(finished_strokes.mean()),
+            'p10_strokes': float(np.percentile(finished_strokes, 10)),
+            'p50_strokes': float(np.percentile(finished_strokes, 50)),
+            'p90_strokes': float(np.percentile(finished_strokes, 90)),
+            'difficulty': float(finished_strokes.mean()) - open_mean_strokes
+        }
+
+    return {
+        'number': hole.number,
+        'distance': hole.distance,
+        'distance_par': hole.par,
+        # With most players never finishing, the few who did say little.
+        'par': max(2, round(summary['p50_strokes'])) if finished_rate >= .5 else None,
+        **summary,
+        'open_mean_strokes': open_mean_strokes,
+        'tree_hit_rate': tree_hits / throws,
+        'finished_rate': finished_rate,
+        'capped_players': int((~finished).sum())
+    }
+
+
+def cache_path(cache_dir, course_info, parameters):
+    key = json.dumps({'version': ANALYSIS_VERSION, 'course': course_info, 'parameters': parameters}, sort_keys=True)
+    digest = hashlib.sha256(key.encode()).hexdigest()[:16]
+    return os.path.join(cache_dir, f'course-{course_info["seed"]}-{digest}.json')
+
+
+def analyze_course(
+    course_info,
+    players=200,
+    max_throws=20,
+    angle_error=.03,
+    power_error=.05,
+    dt=ANALYSIS_DT,
+    processes=None,
+    cache_dir=DEFAULT_CACHE_DIR
+):
+    # Estimated par and difficulty of every hole, from players simulated
+    # playing each one through its trees. Holes are spread over a process
+    # pool using every core, and results are kept in cache_dir by course
+    # and settings, so analyzing the same course again is free.
+    parameters = {
+        'players': players,
+        'max_throws': max_throws,
+        'angle_error': angle_error,
+        'power_error': power_error,
+        'dt': dt
+    }
+    path = None
+    if cache_dir is not None:
+        path = cache_path(cache_dir, course_info, parameters)
+        if os.path.exists(path):
+            with open(path) as cache_file:
+                return json.load(cache_file)
+
+    start_worker(course_info)
+    seed = worker_course.seed
+    tasks = [
+        (index, players, seed, max_throws, angle_error, power_error, dt)
+        for index in range(len(worker_course.holes))
+    ]
+    if processes is None:
+        processes = os.cpu_count() or 1
+    processes = min(processes, len(tasks))
+
+    if processes <= 1:
+        holes = [analyze_hole(task) for task in tasks]
+    else:
+        with Pool(processes, initializer=start_worker, initargs=(course_info,)) as pool:
+            holes = pool.map(analyze_hole, tasks, chunksize=1)
+
+    analysis = {'course': course_info, 'parameters': parameters, 'holes': holes}
+    if path is not None:
+        os.makedirs(cache_dir, exist_ok=True)
+        with open(path, 'w') as cache_file:
+            json.dump(analysis, cache_file, indent=2)
+
+    return analysis
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Estimate par and difficulty by simulating play')
+    parser.add_argument('--seed', type=int, help='analyze the course generated from this seed')
+    parser.add_argument('--course', help='analyze the course saved in this file')
+    parser.add_argument('--holes', type=int, default=18, help='holes in the generated course')
+    parser.add_argument('--trees', type=int, default=10000, help='trees in the generated course')
+    parser.add_argument('--players', type=int, default=200, help='simulated players per hole')
+    parser.add_argument('--processes', type=int, help='worker processes, every core by default')
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR)
+    parser.add_argument('--no-cache', action='store_true')
+    parser.add_argument('--json', action='store_true', help='print the analysis as JSON')
+    args = parser.parse_args()
+
+    if args.course is not None:
+        course_info = {'path': args.course, 'seed': course_from_info({'path': args.course}).seed}
+    elif args.seed is not None:
+        course_info = {'seed': args.seed, 'n_holes': args.holes, 'n_trees': args.trees}
+    else:
+        parser.error('one of --seed or --course is required')
+
+    start = time.perf_counter()
+    analysis = analyze_course(
+        course_info,
+        players=args.players,
+        processes=args.processes,
+        cache_dir=None if args.no_cache else args.cache_dir
+    )
+    seconds = time.perf_counter() - start
+
+    if args.json:
+        print(json.dumps(analysis, indent=2))
+        return
+
+    print(
+        f'{"hole":>4}{"feet":>6}{"par":>5}{"sim par":>9}{"mean":>7}{"p90":>6}{"open":>7}{"difficulty":>12}'
+        f'{"tree hits":>11}{"capped":>8}'
+    )
+    for hole in analysis['holes']:
+        # Holes most players never finished have no par to show, and holes
+        # nobody finished have no strokes either.
+        (par, note) = (hole['par'], '')
+        if par is None:
+            (par, note) = ('-', f'  only {hole["finished_rate"]:.0%} finished')
+        strokes = f'{"-":>7}{"-":>6}'
+        difficulty = f'{"-":>12}'
+        if hole['mean_strokes'] is not None:
+            strokes = f'{hole["mean_strokes"]:>7.2f}{hole["p90_strokes"]:>6.0f}'
+            difficulty = f'{hole["difficulty"]:>12.2f}'
+        print(
+            f'{hole["number"]:>4}{hole["distance"]:>6}{hole["distance_par"]:>5}{par:>9}{strokes}'
+            f'{hole["open_mean_strokes"]:>7.2f}{difficulty}{hole["tree_hit_rate"]:>11.1%}'
+            f'{hole["capped_players"]:>8}{note}'
+        )
+    unfinished = [hole['number'] for hole in analysis['holes'] if hole['par'] is None]
+    total = sum(hole['par'] for hole in analysis['holes'] if hole['par'] is not None)
+    if unfinished:
+        print(f'simulated par {total} without holes {unfinished}, analyzed in {seconds:.2f}s')
+    else:
+        print(f'simulated par {total}, analyzed in {seconds:.2f}s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,367 @@
+import math
+import random
+
+import numpy as np
+
+from forest import impact_times
+from physics import AIR_DRAG, FIXED_DT, MAX_THROW_SPEED, FixedStepClock, fade_rate, turn_rate
+
+
+class BatchResult:
+    def __init__(self, x, y, distance, tree_hit, in_basket):
+        self.x = x
+        self.y = y
+        self.distance = distance
+        self.tree_hit = tree_hit
+        self.in_basket = in_basket
+
+
+def fly(x, y, velocity_angle, velocity, seconds, disc, dt=FIXED_DT):
+    # Disc.update for arrays of discs of disc's flight profile, each moving
+    # for its own seconds. Returns the new x, y, velocity_angle and velocity.
+    y = y + np.sin(velocity_angle) * velocity * seconds
+    x = x + np.cos(velocity_angle) * velocity * seconds
+
+    # Low velocity fade
+    velocity_angle = velocity_angle + np.where((velocity < 10) & (velocity > 0.1), fade_rate(disc) * seconds, 0)
+
+    # High velocity turn
+    velocity_angle = velocity_angle - np.where(velocity > 20, turn_rate(disc) * seconds, 0)
+
+    # NumPy's power can round differently from Python's, so the drag is
+    # worked out as Disc.update does: once for whole steps, and one by one
+    # for the few discs that only moved part of one.
+    seconds = np.broadcast_to(seconds, velocity.shape)
+    drag = np.full(velocity.shape, AIR_DRAG ** (dt * 60))
+    partial = seconds != dt
+    for (index, part) in zip(np.flatnonzero(partial).tolist(), seconds[partial].tolist()):
+        drag[index] = AIR_DRAG ** (part * 60)
+
+    return (x, y, velocity_angle, velocity * drag)
+
+
+def simulate_throws(
+    x,
+    y,
+    angles,
+    powers,
+    disc,
+    forest=None,
+    basket=None,
+    dt=FIXED_DT,
+    max_seconds=120,
+    rng=None,
+    invincible=(False, 0, 0)
+):
+    # Flies every combination of the broadcast x, y, angles and powers with
+    # the flight profile and radius of disc, stepping the same model as
+    # Disc.update and Throw.update on arrays. Angles are absolute, like
+    # Disc.velocity_angle. A throw ends when it stops, reaches the basket
+    # or touches a tree, which is flagged rather than bounced off. Moves
+    # are swept like FlightSimulator.step, so hits land at the contact point.
+    # Given rng, a NumPy Generator, discs instead glance off trees with the
+    # same random turn, slowdown and time ignoring trees as in
+    # FlightSimulator.step, though the rest of the step a hit cut short is
+    # dropped. tree_hit then flags throws that touched any tree.
+    # invincible is whether each throw starts off ignoring trees, for how
+    # long it has and for how long it will, as in DiscPool.launch.
+    (x, y, angles, powers) = np.broadcast_arrays(
+        np.asarray(x, dtype=np.float64),
+        np.asarray(y, dtype=np.float64),
+        np.asarray(angles, dtype=np.float64),
+        np.asarray(powers, dtype=np.float64)
+    )
+    shape = x.shape
+
+    result = BatchResult(
+        x.flatten(),
+        y.flatten(),
+        np.zeros(x.size),
+        np.zeros(x.size, dtype=bool),
+        np.zeros(x.size, dtype=bool)
+    )
+
+    # State of the throws still flying, and where they go in the result.
+    ids = np.arange(x.size)
+    disc_x = x.flatten()
+    disc_y = y.flatten()
+    velocity_angle = angles.flatten()
+    velocity = MAX_THROW_SPEED * (powers.flatten() / 100)
+    distance = np.zeros(x.size)
+    touched = np.zeros(x.size, dtype=bool)
+    (recent_tree_hit, invincible_time, invincible_time_limit) = (
+        np.broadcast_to(np.asarray(values, dtype=dtype), shape).flatten()
+        for (values, dtype) in zip(invincible, (bool, np.float64, np.float64))
+    )
+
+    for _ in range(math.ceil(max_seconds / dt)):
+        if len(ids) == 0:
+            break
+
+        # Throw.update stops a slow disc before it moves.
+        stopped = velocity < 0.5
+        moving = np.where(stopped, 0, velocity)
+        dx = np.cos(velocity_angle) * moving * dt
+        dy = np.sin(velocity_angle) * moving * dt
+
+        tree_t = np.full(len(ids), np.inf)
+        if forest is not None:
+            checked = ~recent_tree_hit
+            tree_t[checked] = forest.impacts(disc_x[checked], disc_y[checked], dx[checked], dy[checked], disc.radius)
+
+        basket_t = np.full(len(ids), np.inf)
+        if basket is not None:
+            basket_t = impact_times(disc_x, disc_y, dx, dy, disc.radius, basket.x, basket.y, basket.radius)
+
+        # Moves are swept, and whichever the disc reaches first wins.
+        in_basket = np.isfinite(basket_t) & (basket_t <= tree_t)
+        tree_hit = np.isfinite(tree_t) & ~in_basket
+        seconds = np.where(in_basket | tree_hit, np.minimum(tree_t, basket_t) * dt, dt)
+
+        distance += velocity * seconds
+        (disc_x, disc_y, velocity_angle, velocity) = fly(disc_x, disc_y, velocity_angle, moving, seconds, disc, dt)
+        touched |= tree_hit
+
+        if rng is not None:
+            hits = np.flatnonzero(tree_hit)
+            if len(hits) > 0:
+                recent_tree_hit[hits] = True
+                invincible_time_limit[hits] = rng.uniform(.1, 1, len(hits))
+                velocity_angle[hits] += rng.uniform(0, 2 * math.pi, len(hits))
+                velocity[hits] *= rng.uniform(0, 0.9, len(hits))
+                tree_hit[hits] = False
+                stopped[hits] = velocity[hits] < 0.5
+
+        expired = recent_tree_hit & (invincible_time >= invincible_time_limit)
+        invincible_time = np.where(recent_tree_hit & ~expired, invincible_time + dt, 0)
+        recent_tree_hit &= ~expired
+
+        done = in_basket | tree_hit | stopped
+        if done.any():
+            finished = ids[done]
+            result.x[finished] = disc_x[done]
+            result.y[finished] = disc_y[done]
+            result.distance[finished] = distance[done]
+            result.tree_hit[finished] = touched[done]
+            result.in_basket[finished] = in_basket[done]
+
+            flying = ~done
+            ids = ids[flying]
+            disc_x = disc_x[flying]
+            disc_y = disc_y[flying]
+            velocity_angle = velocity_angle[flying]
+            velocity = velocity[flying]
+            distance = distance[flying]
+            touched = touched[flying]
+            recent_tree_hit = recent_tree_hit[flying]
+            invincible_time = invincible_time[flying]
+            invincible_time_limit = invincible_time_limit[flying]
+
+    result.x[ids] = disc_x
+    result.y[ids] = disc_y
+    result.distance[ids] = distance
+    result.tree_hit[ids] = touched
+
+    result.x = result.x.reshape(shape)
+    result.y = result.y.reshape(shape)
+    result.distance = result.distance.reshape(shape)
+    result.tree_hit = result.tree_hit.reshape(shape)
+    result.in_basket = result.in_basket.reshape(shape)
+    return result
+
+
+def simulate_grid(x, y, facing_angle, powers, angle_offsets, disc, forest=None, basket=None, dt=FIXED_DT):
+    # Every power against every angle offset from facing_angle, shaped
+    # (len(powers), len(angle_offsets)).
+    (power_grid, angle_grid) = np.meshgrid(powers, angle_offsets, indexing='ij')
+    return simulate_throws(x, y, facing_angle + angle_grid, power_grid, disc, forest, basket, dt)
+
+
+class DiscPool:
+    # Many discs of one flight profile at once, as arrays, stepped together
+    # the way FlightSimulator.step steps a lone throw: every disc in flight
+    # is tested against the trees and its own basket in one batch, a disc
+    # that glances off a tree flies the rest of the step, and each has its
+    # own random.Random to glance with. Given the same generator state, a
+    # disc lands exactly where the lone throw would. Each disc carries a
+    # tag saying whose it is.
+    def __init__(self, forest, disc, dt=FIXED_DT, max_frame_time=0.25, capacity=64):
+        self.forest = forest
+        self.radius = disc.radius
+        self.disc = disc
+        self.dt = dt
+        self.clock = FixedStepClock(dt, max_frame_time)
+        # Bumped whenever a disc is added, launched, moved or removed.
+        self.version = 0
+        self.count = 0
+        self.rngs = []
+        self.allocate(capacity)
+
+    def allocate(self, capacity):
+        self.capacity = capacity
+        self.x = np.zeros(capacity)
+        self.y = np.zeros(capacity)
+        self.previous_x = np.zeros(capacity)
+        self.previous_y = np.zeros(capacity)
+        self.velocity_angle = np.zeros(capacity)
+        self.velocity = np.zeros(capacity)
+        self.distance = np.zeros(capacity)
+        self.basket_x = np.zeros(capacity)
+        self.basket_y = np.zeros(capacity)
+        self.basket_radius = np.zeros(capacity)
+        self.invincible_time = np.zeros(capacity)
+        self.invincible_time_limit = np.zeros(capacity)
+        self.flying = np.zeros(capacity, dtype=bool)
+        self.recent_tree_hit = np.zeros(capacity, dtype=bool)
+        self.in_basket = np.zeros(capacity, dtype=bool)
+        self.tag = np.zeros(capacity, dtype=np.int64)
+
+    def arrays(self):
+        return (
+            'x', 'y', 'previous_x', 'previous_y', 'velocity_angle', 'velocity', 'distance', 'basket_x', 'basket_y',
+            'basket_radius', 'invincible_time', 'invincible_time_limit', 'flying', 'recent_tree_hit', 'in_basket', 'tag'
+        )
+
+    def __len__(self):
+        return self.count
+
+    def any_flying(self):
+        return bool(self.flying[:self.count].any())
+
+    def add(self, x, y, basket, tag=0):
+        # A disc resting at (x, y), for basket. Returns its index.
+        if self.count == self.capacity:
+            old = {name: getattr(self, name) for name in self.arrays()}
+            self.allocate(2 * self.capacity)
+            for (name, values) in old.items():
+                getattr(self, name)[:self.count] = values
+
+        index = self.count
+        for name in self.arrays():
+            getattr(self, name)[index] = 0
+        (self.x[index], self.y[index]) = (x, y)
+        (self.previous_x[index], self.previous_y[index]) = (x, y)
+        (self.basket_x[index], self.basket_y[index], self.basket_radius[index]) = (basket.x, basket.y, basket.radius)
+        self.tag[index] = tag
+        self.rngs.append(None)
+        self.count += 1
+        self.version += 1
+        return index
+
+    def launch(self, index, facing_angle, angle, power, rng=None, invincible=(False, 0, 0)):
+        # As Throw.launch, for the disc at index. invincible is whether the
+        # disc starts off ignoring trees, for how long it has and for how
+        # long it will, as FlightSimulator keeps them between throws.
+        self.velocity_angle[index] = facing_angle + angle
+        self.velocity[index] = MAX_THROW_SPEED * (power / 100)
+        self.distance[index] = 0
+        self.flying[index] = True
+        (self.recent_tree_hit[index], self.invincible_time[index], self.invincible_time_limit[index]) = invincible
+        self.rngs[index] = rng if rng is not None else random.Random()
+        self.version += 1
+
+    def keep(self, kept):
+        # Drops every disc where the boolean mask kept is False. Indices of
+        # the discs kept shift down to fill the gaps.
+        kept = np.asarray(kept, dtype=bool)
+        count = int(kept.sum())
+        for name in self.arrays():
+            values = getattr(self, name)
+            values[:count] = values[:self.count][kept]
+        self.rngs = [rng for (rng, keep) in zip(self.rngs, kept.tolist()) if keep]
+        self.count = count
+        self.version += 1
+
+    def clear(self):
+        self.keep(np.zeros(self.count, dtype=bool))
+
+    def move(self, ids, seconds):
+        # Throw.update and then Disc.update for the discs ids.
+        velocity = self.velocity[ids]
+        self.distance[ids] += velocity * seconds
+        stopped = velocity < 0.5
+        self.flying[ids[stopped]] = False
+        velocity[stopped] = 0
+
+        (self.x[ids], self.y[ids], self.velocity_angle[ids], self.velocity[ids]) = fly(
+            self.x[ids], self.y[ids], self.velocity_angle[ids], velocity, seconds, self.disc, self.dt
+        )
+
+    def step(self):
+        # Returns the indices of the discs that reached their basket.
+        ids = np.flatnonzero(self.flying[:self.count])
+        if len(ids) == 0:
+            return ids
+
+        self.previous_x[ids] = self.x[ids]
+        self.previous_y[ids] = self.y[ids]
+        holed = []
+        pending = ids
+        remaining = np.full(len(ids), self.dt)
+
+        # A disc that glances off a tree goes round again for the rest of
+        # its step, with trees ignored, so this runs at most twice.
+        while len(pending) > 0:
+            velocity = self.velocity[pending]
+            moving = np.where(velocity >= 0.5, velocity, 0)
+            angle = self.velocity_angle[pending]
+            dx = np.cos(angle) * moving * remaining
+            dy = np.sin(angle) * moving * remaining
+            x = self.x[pending]
+            y = self.y[pending]
+
+            tree_t = np.full(len(pending), np.inf)
+            checked = ~self.recent_tree_hit[pending]
+            if checked.any():
+                tree_t[checked] = self.forest.impacts(x[checked], y[checked], dx[checked], dy[checked], self.radius)
+
+            basket_t = impact_times(
+                x, y, dx, dy, self.radius, self.basket_x[pending], self.basket_y[pending], self.basket_radius[pending]
+            )
+            in_basket = np.isfinite(basket_t) & (basket_t <= tree_t)
+            tree_hit = np.isfinite(tree_t) & ~in_basket
+            t = np.where(in_basket, basket_t, np.where(tree_hit, tree_t, 1))
+
+            moved = t > 0
+            self.move(pending[moved], (t * remaining)[moved])
+
+            finished = pending[in_basket]
+            self.flying[finished] = False
+            self.in_basket[finished] = True
+            self.previous_x[finished] = self.x[finished]
+            self.previous_y[finished] = self.y[finished]
+            holed.append(finished)
+
+            glanced = pending[tree_hit]
+            for index in glanced.tolist():
+                rng = self.rngs[index]
+                self.recent_tree_hit[index] = True
+                self.invincible_time_limit[index] = rng.uniform(.1, 1)
+                self.velocity_angle[index] += rng.uniform(0, 2 * math.pi)
+                self.velocity[index] *= rng.uniform(0, 0.9)
+            remaining = remaining[tree_hit] - (t * remaining)[tree_hit]
+            pending = glanced
+
+        holed = np.concatenate(holed)
+        timed = ids[self.recent_tree_hit[ids] & ~self.in_basket[ids]]
+        expired = self.invincible_time[timed] >= self.invincible_time_limit[timed]
+        self.invincible_time[timed] = np.where(expired, 0, self.invincible_time[timed] + self.dt)
+        self.recent_tree_hit[timed[expired]] = False
+
+        self.version += 1
+        return holed
+
+    def advance(self, seconds):
+        # Real time play, as FlightSimulator.advance. Returns the indices of
+        # the discs that reached their basket.
+        holed = [self.step() for _ in self.clock.steps(seconds)]
+        return np.concatenate(holed) if len(holed) > 0 else np.zeros(0, dtype=np.int64)
+
+    def alpha(self):
+        return self.clock.alpha()
+
+    def interpolate(self, alpha):
+        # Every disc's position between its last two steps, as x and y arrays.
+        x = self.previous_x[:self.count]
+        y = self.previous_y[:self.count]
+        return (x + (self.x[:self.count] - x) * alpha, y + (self.y[:self.count] - y) * alpha)
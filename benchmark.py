@@ -0,0 +1,441 @@
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+
+# Benchmarks always run headless.
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+import numpy as np
+import pygame
+
+import caddie
+import crowd
+import main
+from course import CourseGenerator, generate_chunked_course, generate_course
+from game import reset_holes
+from physics import FIXED_DT, FlightSimulator, ThrowStatus
+
+
+def summarize(seconds):
+    # Milliseconds, so a JSON diff between runs reads at a glance.
+    ordered = sorted(seconds)
+    return {
+        'count': len(ordered),
+        'mean_ms': statistics.fmean(ordered) * 1000,
+        'p50_ms': ordered[len(ordered) // 2] * 1000,
+        'p95_ms': ordered[min(len(ordered) - 1, math.ceil(len(ordered) * .95) - 1)] * 1000,
+        'max_ms': ordered[-1] * 1000,
+        'first_ms': seconds[0] * 1000
+    }
+
+
+def new_disc(x, y):
+    return main.Disc(x, y, 0.12, (255, 0, 0), 7, 5, -2, 1)
+
+
+def still_camera(hole, frame, frames, throw):
+    return (hole.tee_pad.x, hole.tee_pad.y)
+
+
+def pan_camera(hole, frame, frames, throw):
+    # From the tee pad to the basket at a steady speed.
+    along = frame / max(frames - 1, 1)
+    x = hole.tee_pad.x + (hole.basket.x - hole.tee_pad.x) * along
+    y = hole.tee_pad.y + (hole.basket.y - hole.tee_pad.y) * along
+    return (x, y)
+
+
+def follow_camera(hole, frame, frames, throw):
+    return (throw.disc.x, throw.disc.y)
+
+
+CAMERA_SCRIPTS = {
+    'still': still_camera,
+    'pan': pan_camera,
+    'follow': follow_camera
+}
+
+
+def bench_frames(played, zooms, frames, seed):
+    # Frame time for each camera script at each zoom, with a throw flying
+    # down the first hole. Every run starts with cold static layer caches.
+    (width, height) = (1024, 768)
+    screen = pygame.display.set_mode((width, height))
+    hole = played.holes[0]
+    direction_angle_hud = main.DirectionAngleHUD()
+    power_hud = main.PowerHUD()
+    score_card_hud = main.ScoreCardHUD()
+    basket_pointer_hud = main.BasketPointerHUD()
+    tee_pad_pointer_hud = main.TeePadPointerHUD()
+    disc_pointer_hud = main.DiscPointerHUD()
+
+    results = {}
+    for (name, camera) in CAMERA_SCRIPTS.items():
+        for zoom in zooms:
+            static_layer = main.StaticLayer(tile_pyramid=main.TilePyramid())
+            renderer = main.DirtyRectRenderer(dirty_rects=False)
+            simulator = FlightSimulator(played.forest, random.Random(seed))
+            throw = main.Throw(1, new_disc(hole.tee_pad.x, hole.tee_pad.y), hole.tee_pad.facing_angle)
+            throw.launch(0, 80)
+            view_port = main.ViewPort(width, height, screen, hole.tee_pad.x, hole.tee_pad.y, zoom)
+
+            seconds = []
+            for frame in range(frames):
+                start = time.perf_counter()
+                if throw.status == ThrowStatus.FLYING:
+                    simulator.advance(throw, hole.basket, FIXED_DT)
+                (view_port.x, view_port.y) = camera(hole, frame, frames, throw)
+                renderer.draw(view_port, static_layer, played.forest, played.holes, throw, (
+                    ('player', None, lambda: throw.display_player(view_port, 0)),
+                    ('disc', None, lambda: throw.disc.display(view_port)),
+                    ('direction_hud', None, lambda: direction_angle_hud.display(view_port)),
+                    ('power_hud', None, lambda: power_hud.display(view_port)),
+                    ('score_card_hud', None, lambda: score_card_hud.display(view_port, played.holes)),
+                    ('basket_pointer_hud', None, lambda: basket_pointer_hud.display(view_port, hole)),
+                    ('tee_pad_pointer_hud', None, lambda: tee_pad_pointer_hud.display(view_port, hole)),
+                    ('disc_pointer_hud', None, lambda: disc_pointer_hud.display(view_port, throw.disc))
+                ))
+                seconds.append(time.perf_counter() - start)
+
+            results[f'{name}@{zoom}'] = summarize(seconds)
+
+    return results
+
+
+def bench_startup(n_trees, seed):
+    # Time from nothing to the first frame on screen, with the trees growing
+    # in the background as main.py does, then until the course is complete.
+    start = time.perf_counter()
+    screen = pygame.display.set_mode((1024, 768))
+    generator = CourseGenerator(seed, n_trees=n_trees, tee_pad_class=main.TeePad, basket_class=main.Basket).start()
+    played = generator.course
+    hole = played.holes[0]
+    throw = main.Throw(1, new_disc(hole.tee_pad.x, hole.tee_pad.y), hole.tee_pad.facing_angle)
+    view_port = main.ViewPort(1024, 768, screen, hole.tee_pad.x, hole.tee_pad.y, .1)
+    static_layer = main.StaticLayer(tile_pyramid=main.TilePyramid())
+    main.DirtyRectRenderer(dirty_rects=False).draw(view_port, static_layer, generator.poll()[0], played.holes, throw, (
+        ('player', None, lambda: throw.display_player(view_port, 0)),
+        ('disc', None, lambda: throw.disc.display(view_port))
+    ))
+    first_frame = time.perf_counter() - start
+    generator.wait()
+    complete = time.perf_counter() - start
+
+    return {'first_frame_seconds': first_frame, 'complete_seconds': complete}
+
+
+def bench_chunked(n_holes, memory_budget, queries, throws, seed):
+    # A course of chunks laid out on demand: the time to lay the holes out,
+    # then a screen sized query at five points down every hole, as a
+    # camera panning the whole course would make, tracking the memory the
+    # chunks take. Then the collision benchmark on the same course.
+    start = time.perf_counter()
+    played = generate_chunked_course(seed, n_holes, memory_budget=memory_budget)
+    generation = time.perf_counter() - start
+
+    forest = played.forest
+    peak = 0
+    start = time.perf_counter()
+    for hole in played.holes:
+        for along in (0, .25, .5, .75, 1):
+            x = hole.tee_pad.x + (hole.basket.x - hole.tee_pad.x) * along
+            y = hole.tee_pad.y + (hole.basket.y - hole.tee_pad.y) * along
+            forest.trees_in(x - 512, y - 384, x + 512, y + 384)
+            peak = max(peak, forest.nbytes())
+    pan = time.perf_counter() - start
+    (left, bottom, right, top) = played.bounds()
+
+    return {
+        'holes': n_holes,
+        'course_km2': (right - left) * (top - bottom) / 1e6,
+        'generation_seconds': generation,
+        'pan_seconds': pan,
+        'chunks_laid_out': forest.generated,
+        'peak_mb': peak / 2 ** 20,
+        'memory_budget_mb': memory_budget / 2 ** 20,
+        'collision': bench_collision(played, queries, throws, seed)
+    }
+
+
+def bench_discs(played, counts, frames, seed):
+    # Frame time with count discs in the air off the first tee at once,
+    # stepped and drawn as one main.DiscPool, against stepping count lone
+    # throws through their own FlightSimulator.
+    screen = pygame.display.set_mode((1024, 768))
+    hole = played.holes[0]
+    view_port = main.ViewPort(1024, 768, screen, hole.tee_pad.x, hole.tee_pad.y, .1)
+    results = {}
+    for count in counts:
+        rng = random.Random(seed)
+        launches = [(rng.uniform(-.5, .5), rng.uniform(50, 100), random.Random(seed + index)) for index in range(count)]
+
+        pool = main.DiscPool(played.forest, new_disc(0, 0))
+        for (angle, power, bounce_rng) in launches:
+            index = pool.add(hole.tee_pad.x, hole.tee_pad.y, hole.basket, crowd.GHOST)
+            pool.launch(index, hole.tee_pad.facing_angle, angle, power, bounce_rng)
+        seconds = []
+        for _ in range(frames):
+            start = time.perf_counter()
+            pool.step()
+            pool.display(view_port)
+            seconds.append(time.perf_counter() - start)
+        results[str(count)] = {'pool': summarize(seconds)}
+
+        throws = []
+        for (angle, power, bounce_rng) in launches:
+            throw = main.Throw(1, new_disc(hole.tee_pad.x, hole.tee_pad.y), hole.tee_pad.facing_angle)
+            throw.launch(angle, power)
+            throws.append((throw, FlightSimulator(played.forest, bounce_rng)))
+        seconds = []
+        for _ in range(frames):
+            start = time.perf_counter()
+            for (throw, simulator) in throws:
+                simulator.step(throw, hole.basket)
+                throw.disc.display(view_port)
+            seconds.append(time.perf_counter() - start)
+        results[str(count)]['lone'] = summarize(seconds)
+
+    return results
+
+
+def bench_trees(n_trees, zooms, frames, seed):
+    # Time to draw every tree in view at each zoom over the middle of the
+    # course, with the vectorized rasterizer and with a pygame.draw.circle
+    # call per tree, and how many pixels the two frames differ by.
+    (width, height) = (1024, 768)
+    screen = pygame.display.set_mode((width, height))
+    played = generate_course(seed, n_trees=n_trees)
+    (left, bottom, right, top) = played.bounds()
+    rasterizer = main.tree_rasterizer
+    results = {}
+    for zoom in zooms:
+        view_port = main.ViewPort(width, height, screen, (left + right) / 2, (bottom + top) / 2, zoom)
+        trees = played.forest.trees_in(*view_port.world_bounds())
+        result = {'trees': len(trees[0])}
+        frame_pixels = {}
+        for (backend, vectorized) in (('vectorized', True), ('circles', False)):
+            rasterizer.vectorized = vectorized
+            seconds = []
+            for _ in range(frames):
+                screen.fill(main.background_colour)
+                start = time.perf_counter()
+                main.draw_trees(view_port, played.forest.trees_in(*view_port.world_bounds()))
+                seconds.append(time.perf_counter() - start)
+            result[backend] = summarize(seconds)
+            frame_pixels[backend] = pygame.surfarray.array2d(screen)
+        rasterizer.vectorized = True
+
+        result['mismatched_pixels'] = int((frame_pixels['vectorized'] != frame_pixels['circles']).sum())
+        results[str(zoom)] = result
+
+    return results
+
+
+def bench_caddie(played, lies, rounds, seed):
+    # Plans from random lies down each hole, searched cold then looked up
+    # again, then whole rounds autoplayed by bots sharing one caddie, as a
+    # load test would run them.
+    rng = random.Random(seed)
+    disc = new_disc(0, 0)
+    planner = caddie.Caddie(played.forest)
+    queries = []
+    for _ in range(lies):
+        hole = rng.choice(played.holes)
+        along = rng.random()
+        x = hole.tee_pad.x + (hole.basket.x - hole.tee_pad.x) * along
+        y = hole.tee_pad.y + (hole.basket.y - hole.tee_pad.y) * along
+        queries.append((x, y, math.atan2(hole.basket.y - y, hole.basket.x - x), hole))
+
+    cold = []
+    for (x, y, facing_angle, hole) in queries:
+        start = time.perf_counter()
+        planner.plan(x, y, facing_angle, disc, hole)
+        cold.append(time.perf_counter() - start)
+    warm = []
+    for (x, y, facing_angle, hole) in queries:
+        start = time.perf_counter()
+        planner.plan(x, y, facing_angle, disc, hole)
+        warm.append(time.perf_counter() - start)
+
+    bots = caddie.Caddie(played.forest)
+    start = time.perf_counter()
+    scores = []
+    throws = 0
+    for index in range(rounds):
+        reset_holes(played)
+        game_round = caddie.autoplay(played, bots, rng_seed=seed + index)
+        scores.append(game_round.scores())
+        throws += sum(1 for entry in game_round.inputs if entry[1] == 'release')
+    seconds = time.perf_counter() - start
+    reset_holes(played)
+
+    return {
+        'cold': summarize(cold),
+        'warm': summarize(warm),
+        'simulated_throws_per_plan': planner.throws / max(planner.misses, 1),
+        'bots': {
+            'rounds': rounds,
+            'seconds': seconds,
+            'throws': throws,
+            'plans': bots.misses,
+            'plans_reused': bots.hits,
+            'scores': scores
+        }
+    }
+
+
+def bench_physics(steps):
+    # Disc.update alone, then Throw.update, which adds the flight path.
+    disc = new_disc(0, 0)
+    disc.velocity = 27
+    start = time.perf_counter()
+    for _ in range(steps):
+        disc.update(FIXED_DT)
+        if disc.velocity < 0.5:
+            disc.velocity = 27
+    disc_seconds = time.perf_counter() - start
+
+    throw = main.Throw(1, new_disc(0, 0), 0)
+    throw.launch(0, 100)
+    start = time.perf_counter()
+    for _ in range(steps):
+        throw.update(FIXED_DT)
+        if not throw.status == ThrowStatus.FLYING:
+            throw = main.Throw(1, new_disc(0, 0), 0)
+            throw.launch(0, 100)
+    throw_seconds = time.perf_counter() - start
+
+    return {
+        'steps': steps,
+        'disc_update_per_second': steps / disc_seconds,
+        'throw_update_per_second': steps / throw_seconds
+    }
+
+
+def bench_collision(played, queries, throws, seed):
+    # Swept tree tests at one full speed step from random spots on the
+    # course, one at a time and as a single batch, then whole throws
+    # flown off every tee through FlightSimulator.
+    forest = played.forest
+    rng = np.random.default_rng(seed)
+    (left, bottom, right, top) = played.bounds()
+    x = rng.uniform(left, right, queries)
+    y = rng.uniform(bottom, top, queries)
+    angle = rng.uniform(0, 2 * math.pi, queries)
+    dx = np.cos(angle) * 27 * FIXED_DT
+    dy = np.sin(angle) * 27 * FIXED_DT
+
+    disc = new_disc(0, 0)
+    hits = 0
+    start = time.perf_counter()
+    for (disc.x, disc.y, step_x, step_y) in zip(x.tolist(), y.tolist(), dx.tolist(), dy.tolist()):
+        if forest.first_swept_hit(disc, step_x, step_y) is not None:
+            hits += 1
+    scalar_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    impacts = forest.impacts(x, y, dx, dy, disc.radius)
+    batch_seconds = time.perf_counter() - start
+    assert int(np.isfinite(impacts).sum()) == hits
+
+    steps = 0
+    start = time.perf_counter()
+    for index in range(throws):
+        hole = played.holes[index % len(played.holes)]
+        throw = main.Throw(1, new_disc(hole.tee_pad.x, hole.tee_pad.y), hole.tee_pad.facing_angle)
+        throw.launch(0, 80)
+        simulator = FlightSimulator(forest, random.Random(seed + index))
+        for _ in range(math.ceil(120 / simulator.dt)):
+            steps += 1
+            if simulator.step(throw, hole.basket) or not throw.status == ThrowStatus.FLYING:
+                break
+    throw_seconds = time.perf_counter() - start
+
+    return {
+        'trees': len(forest),
+        'queries': queries,
+        'hits': hits,
+        'scalar_queries_per_second': queries / scalar_seconds,
+        'batch_queries_per_second': queries / batch_seconds,
+        'throws': throws,
+        'throws_per_second': throws / throw_seconds,
+        'simulator_steps_per_second': steps / throw_seconds
+    }
+
+
+def main_benchmark():
+    parser = argparse.ArgumentParser(description='Disc Golf Course Creator benchmarks')
+    parser.add_argument('--seed', type=int, default=1, help='seed for the courses and throws')
+    parser.add_argument('--output', help='write the results to this JSON file instead of stdout')
+    parser.add_argument('--zooms', type=float, nargs='+', default=[.02, .1, .5, 1])
+    parser.add_argument('--frames', type=int, default=120, help='frames per camera script and zoom')
+    parser.add_argument('--tree-counts', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--physics-steps', type=int, default=200000)
+    parser.add_argument('--queries', type=int, default=20000, help='collision queries per tree count')
+    parser.add_argument('--throws', type=int, default=20, help='simulated throws per tree count')
+    parser.add_argument('--disc-counts', type=int, nargs='+', default=[1, 4, 16, 64, 256, 1024])
+    parser.add_argument('--chunked-holes', type=int, default=300, help='holes in the chunked course')
+    parser.add_argument('--chunk-budget-mb', type=float, default=2, help='memory budget for the chunked course')
+    parser.add_argument('--raster-trees', type=int, default=100000, help='trees in the course for tree drawing')
+    parser.add_argument('--raster-zooms', type=float, nargs='+', default=[.1, .25, .5, 1, 2])
+    parser.add_argument('--caddie-lies', type=int, default=20, help='lies for the caddie to plan')
+    parser.add_argument('--bot-rounds', type=int, default=2, help='rounds autoplayed by caddie bots')
+    args = parser.parse_args()
+
+    pygame.init()
+
+    results = {
+        'meta': {
+            'seed': args.seed,
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': sys.version.split()[0],
+            'pygame': pygame.version.ver,
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'video_driver': pygame.display.get_driver()
+        },
+        'generation': {},
+        'startup': {},
+        'collision': {}
+    }
+
+    for n_trees in args.tree_counts:
+        start = time.perf_counter()
+        played = generate_course(args.seed, n_trees=n_trees)
+        results['generation'][str(n_trees)] = {'seconds': time.perf_counter() - start}
+        results['collision'][str(n_trees)] = bench_collision(played, args.queries, args.throws, args.seed)
+        results['startup'][str(n_trees)] = bench_startup(n_trees, args.seed)
+
+    results['chunked'] = bench_chunked(
+        args.chunked_holes,
+        int(args.chunk_budget_mb * 2 ** 20),
+        args.queries,
+        args.throws,
+        args.seed
+    )
+
+    played = generate_course(args.seed, tee_pad_class=main.TeePad, basket_class=main.Basket)
+    results['frames'] = bench_frames(played, args.zooms, args.frames, args.seed)
+    results['discs'] = bench_discs(played, args.disc_counts, args.frames, args.seed)
+    results['trees'] = bench_trees(args.raster_trees, args.raster_zooms, args.frames, args.seed)
+    results['caddie'] = bench_caddie(played, args.caddie_lies, args.bot_rounds, args.seed)
+    results['physics'] = bench_physics(args.physics_steps)
+
+    pygame.quit()
+
+    report = json.dumps(results, indent=2)
+    if args.output is not None:
+        with open(args.output, 'w') as output_file:
+            output_file.write(report + '\n')
+    else:
+        print(report)
+
+
+if __name__ == '__main__':
+    main_benchmark()
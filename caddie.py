@@ -0,0 +1,308 @@
+import argparse
+from collections import OrderedDict
+import math
+import os
+import time
+
+import numpy as np
+
+from batch import simulate_throws
+from game import Round, course_from_info, reset_holes, save_log
+from physics import FIXED_DT
+
+
+class Shot:
+    def __init__(self, angle, power, x, y, distance, in_basket, tree_hit):
+        # The angle offset from the throw's facing angle and the power to
+        # throw at, where the disc comes to rest and how far that is from
+        # the basket.
+        self.angle = angle
+        self.power = power
+        self.x = x
+        self.y = y
+        self.distance = distance
+        self.in_basket = in_basket
+        self.tree_hit = tree_hit
+
+
+class Caddie:
+    # Picks the throw from a lie that leaves the disc closest to the basket.
+    # Only throws a player can make are tried: angle offsets in steps of
+    # angle_step up to max_angle either way and powers in steps of
+    # power_step, as the arrow keys and power bar give them. The search
+    # starts on a coarse grid of those with the batch simulator at
+    # coarse_dt, then repeatedly halves the spacing and tries the throws up
+    # to spread steps from each of the keep best so far. The last, finest
+    # round is scored at dt, so the chosen throw flies in play as
+    # predicted. Where a throw ends up after it touches a tree is down to
+    # chance, so those are scored by replays of the bounce: the mean they
+    # leave plus confidence standard errors of it, so a throw isn't picked
+    # for a few lucky replays out of hundreds, and tree_penalty metres
+    # more, which steers clear of trees unless glancing off one is the only
+    # way to the basket.
+    #
+    # Plans are kept by hole, disc, and position and facing angle rounded
+    # to quantum metres and angle_quantum radians, so a lie close enough to
+    # one already planned gets that plan back rather than a search. The
+    # least recently used are dropped past max_entries.
+    def __init__(
+        self,
+        forest,
+        dt=FIXED_DT,
+        coarse_dt=1 / 15,
+        angle_step=math.pi / 64,
+        max_angle=math.pi / 2,
+        power_step=1,
+        max_power=100,
+        coarse_steps=(2, 8),
+        keep=4,
+        spread=2,
+        coarse_bounces=8,
+        bounces=32,
+        confidence=2,
+        tree_penalty=5,
+        ignore_time=.1,
+        miss_cost=20,
+        min_progress=.25,
+        quantum=.25,
+        angle_quantum=math.pi / 1024,
+        max_entries=4096
+    ):
+        self.forest = forest
+        self.dt = dt
+        self.coarse_dt = coarse_dt
+        self.angle_step = angle_step
+        self.max_angle_steps = round(max_angle / angle_step)
+        self.power_step = power_step
+        self.max_power_steps = round(max_power / power_step)
+        self.coarse_steps = coarse_steps
+        self.keep = keep
+        self.spread = spread
+        self.coarse_bounces = coarse_bounces
+        self.bounces = bounces
+        self.confidence = confidence
+        self.tree_penalty = tree_penalty
+        self.ignore_time = ignore_time
+        self.miss_cost = miss_cost
+        self.min_progress = min_progress
+        self.quantum = quantum
+        self.angle_quantum = angle_quantum
+        self.max_entries = max_entries
+        self.plans = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.throws = 0
+
+    def set_forest(self, forest):
+        # Plans through other trees no longer hold.
+        if forest is not self.forest:
+            self.forest = forest
+            self.plans.clear()
+
+    def plan(self, x, y, facing_angle, disc, hole):
+        key = (
+            hole.number,
+            (disc.radius, disc.speed, disc.glide, disc.turn, disc.fade),
+            round(x / self.quantum),
+            round(y / self.quantum),
+            round(facing_angle / self.angle_quantum)
+        )
+        shot = self.plans.get(key)
+        if shot is not None:
+            self.hits += 1
+            self.plans.move_to_end(key)
+            return shot
+
+        self.misses += 1
+        shot = self.search(x, y, facing_angle, disc, hole.basket)
+        self.plans[key] = shot
+        if len(self.plans) > self.max_entries:
+            self.plans.popitem(last=False)
+
+        return shot
+
+    def plan_throw(self, throw, hole):
+        # The plan for a throw waiting to be made.
+        return self.plan(throw.disc.x, throw.disc.y, throw.facing_angle, throw.disc, hole)
+
+    def score(self, x, y, facing_angle, disc, basket, throws, dt, bounces, rng, invincible):
+        # Scores for throws given as (angle steps, power steps), lowest best,
+        # with how far from the basket each leaves the disc and the result
+        # of each. A throw scores how far it leaves the disc, and miss_cost
+        # more for the throw still to come unless it's in the basket. Throws
+        # that touch a tree are replayed bounces times glancing off at
+        # random as in play, and score the mean of the replays, plus
+        # confidence standard errors of it and tree_penalty.
+        steps = np.array(throws, dtype=np.float64).reshape(-1, 2)
+        angles = facing_angle + steps[:, 0] * self.angle_step
+        powers = steps[:, 1] * self.power_step
+        result = simulate_throws(x, y, angles, powers, disc, self.forest, basket, dt, invincible=invincible)
+        self.throws += len(steps)
+        distance = np.where(result.in_basket, 0, np.hypot(result.x - basket.x, result.y - basket.y))
+        cost = np.where(result.in_basket, 0, distance + self.miss_cost)
+
+        margin = np.zeros(len(steps))
+        hits = np.flatnonzero(result.tree_hit)
+        if len(hits) > 0 and bounces > 0:
+            bounced = simulate_throws(
+                x,
+                y,
+                np.repeat(angles[hits], bounces),
+                np.repeat(powers[hits], bounces),
+                disc,
+                self.forest,
+                basket,
+                dt,
+                rng=rng,
+                invincible=invincible
+            )
+            self.throws += len(hits) * bounces
+            left = np.where(bounced.in_basket, 0, np.hypot(bounced.x - basket.x, bounced.y - basket.y))
+            left_cost = np.where(bounced.in_basket, 0, left + self.miss_cost).reshape(len(hits), bounces)
+            distance[hits] = left.reshape(len(hits), bounces).mean(axis=1)
+            cost[hits] = left_cost.mean(axis=1)
+            margin[hits] = self.confidence * left_cost.std(axis=1) / math.sqrt(bounces)
+
+        scores = cost + margin + np.where(result.tree_hit, self.tree_penalty, 0)
+        # A throw too soft to move the disc would leave it there for good,
+        # and one that barely gets it closer leaves the next throw no
+        # better off, which near a basket among trees only wastes throws.
+        scores[(result.x == x) & (result.y == y)] = np.inf
+        stalled = distance > math.hypot(x - basket.x, y - basket.y) - self.min_progress
+        scores[stalled & ~result.tree_hit & ~result.in_basket] = np.inf
+        return (scores, distance, result)
+
+    def resting_on_tree(self, x, y, disc):
+        # Whether a disc at (x, y) overlaps a tree.
+        if self.forest is None:
+            return False
+        return bool(self.forest.impacts(np.array([x]), np.array([y]), np.zeros(1), np.zeros(1), disc.radius)[0] == 0)
+
+    def search(self, x, y, facing_angle, disc, basket):
+        # A disc resting against a tree in play keeps glancing off it and
+        # ignoring it in turn, so it's thrown while ignoring trees, though
+        # for as little as ignore_time.
+        invincible = (self.resting_on_tree(x, y, disc), 0, self.ignore_time)
+        # Bounces are drawn the same way every search, so a lie always gets
+        # the same plan.
+        rng = np.random.default_rng(0)
+        (angle_steps, power_steps) = self.coarse_steps
+        throws = [
+            (angle, power)
+            for angle in range(-self.max_angle_steps, self.max_angle_steps + 1, angle_steps)
+            for power in range(power_steps, self.max_power_steps + 1, power_steps)
+        ]
+        while True:
+            final = angle_steps == 1 and power_steps == 1
+            (scores, distance, result) = self.score(
+                x,
+                y,
+                facing_angle,
+                disc,
+                basket,
+                throws,
+                self.dt if final else self.coarse_dt,
+                self.bounces if final else self.coarse_bounces,
+                rng,
+                invincible
+            )
+            # Ties go to the softest, straightest throw.
+            order = sorted(
+                range(len(throws)),
+                key=lambda index: (scores[index], throws[index][1], abs(throws[index][0]), throws[index][0])
+            )
+            if final:
+                break
+
+            angle_steps = max(angle_steps // 2, 1)
+            power_steps = max(power_steps // 2, 1)
+            around = [throws[index] for index in order[:self.keep]]
+            throws = sorted({
+                (angle + angle_offset * angle_steps, power + power_offset * power_steps)
+                for (angle, power) in around
+                for angle_offset in range(-self.spread, self.spread + 1)
+                for power_offset in range(-self.spread, self.spread + 1)
+                if abs(angle + angle_offset * angle_steps) <= self.max_angle_steps
+                and 1 <= power + power_offset * power_steps <= self.max_power_steps
+            })
+
+        best = order[0]
+        (angle, power) = throws[best]
+        return Shot(
+            angle * self.angle_step,
+            power * self.power_step,
+            float(result.x[best]),
+            float(result.y[best]),
+            float(distance[best]),
+            bool(result.in_basket[best]),
+            bool(result.tree_hit[best])
+        )
+
+
+def autoplay(played, caddie=None, rng_seed=None, max_throws=20, course_info=None):
+    # Plays a round throwing the caddie's plan every time, through the same
+    # inputs a player gives, so its log replays like any other. A round
+    # still out on a hole after max_throws there is left unfinished.
+    if caddie is None:
+        caddie = Caddie(played.forest)
+    game_round = Round(played, rng_seed, course_info=course_info)
+    while not game_round.finished and game_round.throw.count <= max_throws:
+        throw = game_round.throw
+        # A player takes a moment over a throw, long enough for a disc
+        # resting against a tree to glance off it and ignore trees, as the
+        # plan has it.
+        disc = throw.disc
+        while game_round.throw is throw and not game_round.simulator.recent_tree_hit:
+            if not caddie.resting_on_tree(disc.x, disc.y, disc):
+                break
+            game_round.step()
+        if game_round.throw is not throw:
+            continue
+        shot = caddie.plan_throw(throw, game_round.hole())
+        game_round.turn(shot.angle - game_round.angle)
+        game_round.press()
+        game_round.release(shot.power)
+        while game_round.throw is throw and not game_round.finished:
+            game_round.step()
+
+    return game_round
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Play rounds with the caddie picking every throw')
+    parser.add_argument('--seed', type=int, default=1, help='play the course generated from this seed')
+    parser.add_argument('--course', help='play the course saved in this file')
+    parser.add_argument('--holes', type=int, default=18, help='holes in the generated course')
+    parser.add_argument('--trees', type=int, default=10000, help='trees in the generated course')
+    parser.add_argument('--rounds', type=int, default=1, help='rounds to play')
+    parser.add_argument('--max-throws', type=int, default=20, help='throws on a hole before giving up on it')
+    parser.add_argument('--save-logs', help='save each round log to this directory for game.py to replay')
+    args = parser.parse_args()
+
+    if args.course is not None:
+        course_info = {'path': args.course, 'seed': course_from_info({'path': args.course}).seed}
+    else:
+        course_info = {'seed': args.seed, 'n_holes': args.holes, 'n_trees': args.trees}
+    played = course_from_info(course_info)
+
+    # One caddie for every round, so the lies they share are planned once.
+    caddie = Caddie(played.forest)
+    start = time.perf_counter()
+    for index in range(args.rounds):
+        reset_holes(played)
+        game_round = autoplay(played, caddie, rng_seed=index, max_throws=args.max_throws, course_info=course_info)
+        total = sum(score for score in game_round.scores() if score is not None)
+        print(f'round {index + 1}: {game_round.scores()} total {total}')
+        if args.save_logs is not None:
+            os.makedirs(args.save_logs, exist_ok=True)
+            save_log(game_round, os.path.join(args.save_logs, f'caddie-{index + 1}.json'))
+
+    seconds = time.perf_counter() - start
+    print(
+        f'{args.rounds} rounds in {seconds:.2f}s, {caddie.misses} lies planned with {caddie.throws} simulated throws, '
+        f'{caddie.hits} plans reused'
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,355 @@
+from enum import Enum
+import math
+import mmap
+import os
+import random
+import struct
+import threading
+
+import numpy as np
+
+from forest import ChunkedForest, Forest
+
+
+# Magic, version, seed, holes, trees, then the tree grid: cell size, left
+# and bottom cell, columns, rows and the largest tree radius.
+COURSE_HEADER = struct.Struct('<4sIQQQdqqQQd')
+COURSE_MAGIC = b'DGCC'
+COURSE_VERSION = 1
+
+# Smallest and largest tree radius.
+TREE_RADII = (.25, 5)
+# Trees per square metre, about that of 10,000 trees around 18 holes.
+DEFAULT_TREE_DENSITY = .005
+
+
+class Basket:
+    def __init__(self, x, y):
+        self.x = x
+        self.y = y
+        self.radius = 0.27051
+
+
+class TeePad:
+    def __init__(self, x, y, facing_angle):
+        self.x = x
+        self.y = y
+        self.facing_angle = facing_angle
+
+
+class HoleStatus(Enum):
+    UPCOMING = 1
+    CURRENT = 2
+    COMPLETE = 3
+
+
+class Hole:
+    def __init__(self, number, tee_pad, basket):
+        self.number = number
+        self.tee_pad = tee_pad
+        self.basket = basket
+        meters = math.dist((tee_pad.x, tee_pad.y), (basket.x, basket.y))
+        self.distance =  int(meters * 3.28084) # Meters to feet with decimal removed.
+        if meters < 75:
+            self.par = 2
+        elif meters < 175:
+            self.par = 3
+        elif meters < 320:
+            self.par = 4
+        elif meters < 400:
+            self.par = 5
+        else:
+            self.par = 6
+
+        self.status = HoleStatus.UPCOMING
+        self.score = None
+
+    def bounding_rect(self):
+        # (left, bottom, right, top) in world coordinates.
+        most_left = min(self.tee_pad.x, self.basket.x)
+        most_bottom = min(self.tee_pad.y, self.basket.y)
+        most_right = max(self.tee_pad.x, self.basket.x)
+        most_top = max(self.tee_pad.y, self.basket.y)
+
+        return (most_left, most_bottom, most_right, most_top)
+
+
+def rects_overlap(a, b):
+    return a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]
+
+
+class RectGrid:
+    # Placed hole rectangles bucketed by every grid cell they cover, so a
+    # new hole is only checked against the holes near it.
+    def __init__(self, cell_size=100):
+        self.cell_size = cell_size
+        self.cells = {}
+
+    def cells_under(self, rect):
+        for cell_x in range(math.floor(rect[0] / self.cell_size), math.floor(rect[2] / self.cell_size) + 1):
+            for cell_y in range(math.floor(rect[1] / self.cell_size), math.floor(rect[3] / self.cell_size) + 1):
+                yield (cell_x, cell_y)
+
+    def add(self, rect):
+        for cell in self.cells_under(rect):
+            self.cells.setdefault(cell, []).append(rect)
+
+    def overlaps(self, rect):
+        for cell in self.cells_under(rect):
+            for placed in self.cells.get(cell, ()):
+                if rects_overlap(rect, placed):
+                    return True
+
+        return False
+
+
+class Course:
+    def __init__(self, seed, holes, forest):
+        self.seed = seed
+        self.holes = holes
+        self.forest = forest
+
+    def bounds(self):
+        # (left, bottom, right, top) around every hole.
+        rects = [hole.bounding_rect() for hole in self.holes]
+        return (
+            min(rect[0] for rect in rects),
+            min(rect[1] for rect in rects),
+            max(rect[2] for rect in rects),
+            max(rect[3] for rect in rects)
+        )
+
+
+def generate_holes(rng, n_holes, tee_pad_class=TeePad, basket_class=Basket, max_attempts=10000):
+    holes = []
+    placed = RectGrid()
+    for hole_number in range(1, n_holes + 1):
+        for _ in range(max_attempts):
+            if len(holes) == 0:
+                tee_pad = tee_pad_class(0, 0, rng.uniform(0, 2 * math.pi))
+            else:
+                previous_hole = holes[-1]
+                tee_pad = tee_pad_class(
+                    previous_hole.basket.x + rng.uniform(-30, 30),
+                    previous_hole.basket.y + rng.uniform(-30, 30),
+                    rng.uniform(0, 2 * math.pi)
+                )
+
+            # Place the basket down range from the tee pad
+            random_adjust_angle = rng.uniform(-1 * math.pi / 4, math.pi / 4)
+            distance = rng.uniform(30, 427)
+            basket_x = math.cos(tee_pad.facing_angle + random_adjust_angle) * distance
+            basket_y = math.sin(tee_pad.facing_angle + random_adjust_angle) * distance
+            basket = basket_class(tee_pad.x + basket_x, tee_pad.y + basket_y)
+
+            hole = Hole(hole_number, tee_pad, basket)
+            if not placed.overlaps(hole.bounding_rect()):
+                placed.add(hole.bounding_rect())
+                holes.append(hole)
+                break
+        else:
+            raise RuntimeError(f'Could not place hole {hole_number} after {max_attempts} attempts')
+
+    return holes
+
+
+def tree_batches(seed, n_trees, bounds, batch_size=65536):
+    # Positions and radii are drawn a batch at a time from their own
+    # generator, so the trees only depend on the seed and the bounds.
+    rng = np.random.default_rng(seed)
+    (left, bottom, right, top) = bounds
+    for start in range(0, n_trees, batch_size):
+        count = min(batch_size, n_trees - start)
+        yield (rng.uniform(left, right, count), rng.uniform(bottom, top, count), rng.uniform(TREE_RADII[0], TREE_RADII[1], count))
+
+
+def forest_from_batches(batches, cell_size=10):
+    return Forest(
+        np.concatenate([batch[0] for batch in batches] or [np.zeros(0)]),
+        np.concatenate([batch[1] for batch in batches] or [np.zeros(0)]),
+        np.concatenate([batch[2] for batch in batches] or [np.zeros(0)]),
+        cell_size
+    )
+
+
+def generate_trees(seed, n_trees, bounds, batch_size=65536, cell_size=10):
+    return forest_from_batches(list(tree_batches(seed, n_trees, bounds, batch_size)), cell_size)
+
+
+def generate_course(seed=None, n_holes=18, n_trees=10000, tee_pad_class=TeePad, basket_class=Basket):
+    # The same seed always lays out the same course. Without one a seed is
+    # picked and kept on the course so it can be made again.
+    if seed is None:
+        seed = random.randrange(2 ** 32)
+
+    holes = generate_holes(random.Random(seed), n_holes, tee_pad_class, basket_class)
+    course = Course(seed, holes, None)
+    course.forest = generate_trees(seed, n_trees, course.bounds())
+    return course
+
+
+def generate_chunked_course(
+    seed=None,
+    n_holes=18,
+    tree_density=DEFAULT_TREE_DENSITY,
+    chunk_size=256,
+    memory_budget=64 * 1024 * 1024,
+    tee_pad_class=TeePad,
+    basket_class=Basket
+):
+    # Holes laid out as generate_course() does, in a forest with no edge
+    # whose trees are only laid out where something looks, so nothing is
+    # grown up front and memory stays under memory_budget however far the
+    # course runs. The trees aren't the ones generate_course() would make.
+    if seed is None:
+        seed = random.randrange(2 ** 32)
+
+    holes = generate_holes(random.Random(seed), n_holes, tee_pad_class, basket_class)
+    forest = ChunkedForest(seed, tree_density, chunk_size, TREE_RADII, memory_budget=memory_budget)
+    return Course(seed, holes, forest)
+
+
+class CourseGenerator:
+    # Lays a course out like generate_course(), but grows the trees on a
+    # background thread. The holes are there from the start, and the
+    # course's forest is swapped for a bigger one as batches of trees come
+    # in, so the course can be drawn while it fills up. A new forest is only
+    # built once the trees have doubled since the last, which keeps the
+    # rebuilds to about twice the work of building the final one. done is
+    # set once the forest is the same one generate_course() would make.
+    def __init__(
+        self,
+        seed=None,
+        n_holes=18,
+        n_trees=10000,
+        tee_pad_class=TeePad,
+        basket_class=Basket,
+        batch_size=65536,
+        cell_size=10
+    ):
+        if seed is None:
+            seed = random.randrange(2 ** 32)
+
+        holes = generate_holes(random.Random(seed), n_holes, tee_pad_class, basket_class)
+        self.course = Course(seed, holes, Forest([], [], [], cell_size))
+        self.n_trees = n_trees
+        self.batch_size = batch_size
+        self.cell_size = cell_size
+        self.grown = 0
+        self.done = False
+        self.error = None
+        self.thread = threading.Thread(target=self.run, name='course-generator', daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def run(self):
+        try:
+            batches = []
+            for batch in tree_batches(self.course.seed, self.n_trees, self.course.bounds(), self.batch_size):
+                batches.append(batch)
+                self.grown += len(batch[0])
+                if self.grown >= 2 * len(self.course.forest) or self.grown == self.n_trees:
+                    self.course.forest = forest_from_batches(batches, self.cell_size)
+        except Exception as error:
+            self.error = error
+            raise
+        self.done = True
+
+    def poll(self):
+        # The course's forest so far and whether it's finished, raising
+        # anything generation failed with. Done is read before the forest,
+        # so a finished poll always has the last one.
+        if self.error is not None:
+            raise RuntimeError('Course generation failed') from self.error
+
+        done = self.done
+        return (self.course.forest, done)
+
+    def wait(self):
+        self.thread.join()
+        return self.poll()[0]
+
+
+def save_course(course, path):
+    # A header, the holes as tee x, y, facing angle and basket x, y, then
+    # the trees packed as float64 arrays in grid cell order behind the
+    # index of where each cell starts. The file is written beside path and
+    # then moved over it, so a course memory mapped from path, even the
+    # one being saved, keeps reading the old file.
+    temporary_path = f'{path}.{os.getpid()}.tmp'
+    try:
+        with open(temporary_path, 'wb') as course_file:
+            write_course(course_file, course, course.forest)
+        os.replace(temporary_path, path)
+    except BaseException:
+        if os.path.exists(temporary_path):
+            os.remove(temporary_path)
+        raise
+
+
+def write_course(course_file, course, forest):
+    course_file.write(COURSE_HEADER.pack(
+        COURSE_MAGIC,
+        COURSE_VERSION,
+        course.seed,
+        len(course.holes),
+        len(forest.x),
+        forest.cell_size,
+        forest.cell_left,
+        forest.cell_bottom,
+        forest.columns,
+        forest.rows,
+        forest.max_radius
+    ))
+
+    holes = np.array(
+        [(h.tee_pad.x, h.tee_pad.y, h.tee_pad.facing_angle, h.basket.x, h.basket.y) for h in course.holes],
+        dtype='<f8'
+    )
+    course_file.write(holes.tobytes())
+    course_file.write(forest.cell_start.astype('<i8').tobytes())
+    course_file.write(forest.x.astype('<f8').tobytes())
+    course_file.write(forest.y.astype('<f8').tobytes())
+    course_file.write(forest.radius.astype('<f8').tobytes())
+
+
+def load_course(path, tee_pad_class=TeePad, basket_class=Basket):
+    # The tree arrays are memory mapped rather than read, so opening a
+    # course costs the same for any number of trees and only the pages
+    # around the cells that get searched or drawn are ever touched.
+    with open(path, 'rb') as course_file:
+        mapped = mmap.mmap(course_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    (magic, version, seed, n_holes, n_trees, cell_size, cell_left, cell_bottom, columns, rows, max_radius) = \
+        COURSE_HEADER.unpack_from(mapped, 0)
+    if magic != COURSE_MAGIC or version != COURSE_VERSION:
+        raise ValueError(f'{path} is not a version {COURSE_VERSION} course file')
+
+    offset = COURSE_HEADER.size
+    holes = []
+    for (number, values) in enumerate(struct.iter_unpack('<5d', mapped[offset:offset + n_holes * 40]), 1):
+        (tee_x, tee_y, facing_angle, basket_x, basket_y) = values
+        holes.append(Hole(number, tee_pad_class(tee_x, tee_y, facing_angle), basket_class(basket_x, basket_y)))
+    offset += n_holes * 40
+
+    view = memoryview(mapped)
+    cells = columns * rows + 1
+    cell_start = view[offset:offset + cells * 8].cast('q')
+    offset += cells * 8
+    (xs, ys, radii) = (view[offset + i * n_trees * 8:offset + (i + 1) * n_trees * 8].cast('d') for i in range(3))
+
+    forest = Forest.from_sorted(
+        np.frombuffer(xs, dtype='<f8'),
+        np.frombuffer(ys, dtype='<f8'),
+        np.frombuffer(radii, dtype='<f8'),
+        np.frombuffer(cell_start, dtype='<i8'),
+        cell_size,
+        cell_left,
+        cell_bottom,
+        columns,
+        rows,
+        max_radius
+    )
+    return Course(seed, holes, forest)
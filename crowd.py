@@ -0,0 +1,93 @@
+import random
+
+import numpy as np
+
+from analysis import PowerTable, analysis_disc
+from game import course_from_info, load_log, recorded_throws, reset_holes
+
+
+# DiscPool tags.
+COMPANION = 1
+GHOST = 2
+
+
+def load_ghosts(paths, course_info, best=None):
+    # The throws recorded in the round logs at paths that were played on
+    # the course described by course_info, by (hole, throw count), and the
+    # paths of the logs of other courses. Given best, each hole only keeps
+    # the throws of the best rounds on it, lowest score first.
+    rounds = []
+    skipped = []
+    played = None
+    for path in paths:
+        log = load_log(path)
+        if log['course'] != course_info:
+            skipped.append(path)
+            continue
+
+        if played is None:
+            played = course_from_info(course_info)
+        reset_holes(played)
+        rounds.append((log['scores'], recorded_throws(log, played)))
+
+    ghosts = {}
+    for (hole, _) in enumerate(played.holes if played is not None else (), 1):
+        # Rounds that never finished the hole rank last.
+        ranked = sorted(rounds, key=lambda recorded: recorded[0][hole - 1] or float('inf'))
+        for (_, throws) in ranked[:best]:
+            for throw in throws:
+                if throw['hole'] == hole:
+                    ghosts.setdefault((hole, throw['count']), []).append(throw)
+
+    return (ghosts, skipped)
+
+
+class Crowd:
+    # Everyone on the course besides the player, flown together in one
+    # DiscPool: companions playing each hole alongside them, and ghosts of
+    # recorded throws. Whenever the player throws, each companion whose disc
+    # has come to rest throws at the basket too, and the ghosts recorded
+    # as the same throw of the same hole launch from where they were made,
+    # replacing the last throw's. Companions aim as the analysis' players do.
+    def __init__(self, pool, companions=0, ghosts=None, seed=0, angle_error=.03, power_error=.05):
+        self.pool = pool
+        self.companions = companions
+        self.ghosts = ghosts if ghosts is not None else {}
+        self.aim_rng = np.random.default_rng(seed)
+        self.bounce_rng = random.Random(seed)
+        self.angle_error = angle_error
+        self.power_error = power_error
+        self.table = PowerTable(analysis_disc(), dt=pool.dt)
+        self.hole = None
+
+    def start_hole(self, hole):
+        pool = self.pool
+        pool.clear()
+        self.hole = hole
+        for _ in range(self.companions):
+            pool.add(hole.tee_pad.x, hole.tee_pad.y, hole.basket, COMPANION)
+
+    def throw(self, count):
+        # The player just made throw number count on the current hole.
+        pool = self.pool
+        hole = self.hole
+        # Companions were added first, so they keep the lowest indices.
+        pool.keep(np.arange(len(pool)) < self.companions)
+
+        ready = np.flatnonzero(~pool.flying[:self.companions] & ~pool.in_basket[:self.companions])
+        if len(ready) > 0:
+            (angles, powers) = self.table.plan(
+                pool.x[ready], pool.y[ready], hole.basket, self.aim_rng, self.angle_error, self.power_error
+            )
+            for (index, angle, power) in zip(ready.tolist(), angles.tolist(), powers.tolist()):
+                pool.launch(index, 0, angle, power, self.bounce_rng)
+
+        for ghost in self.ghosts.get((hole.number, count), ()):
+            index = pool.add(ghost['x'], ghost['y'], hole.basket, GHOST)
+            rng = random.Random()
+            rng.setstate(ghost['rng_state'])
+            invincible = (ghost['recent_tree_hit'], ghost['invincible_time'], ghost['invincible_time_limit'])
+            pool.launch(index, ghost['facing_angle'], ghost['angle'], ghost['power'], rng, invincible)
+
+    def advance(self, seconds):
+        self.pool.advance(seconds)
@@ -0,0 +1,320 @@
+from collections import OrderedDict
+import math
+import threading
+
+import numpy as np
+
+from physics import offset_impact
+
+
+def impact_times(x, y, dx, dy, radius, other_x, other_y, other_radius):
+    # Array form of physics.time_of_impact(), with inf for no impact.
+    ox = x - other_x
+    oy = y - other_y
+    reach = radius + other_radius
+    a = dx * dx + dy * dy
+    b = ox * dx + oy * dy
+    discriminant = b * b - a * (ox * ox + oy * oy - reach * reach)
+    approaching = (a > 0) & (b < 0) & (discriminant >= 0)
+
+    t = (-b - np.sqrt(np.where(approaching, discriminant, 0))) / np.where(approaching, a, 1)
+    t = np.where(approaching & (t <= 1), np.maximum(t, 0), np.inf)
+    return np.where(np.hypot(ox, oy) < reach, 0, t)
+
+
+class Forest:
+    # Every tree of a course as contiguous x, y and radius arrays sorted by
+    # grid cell, with the index of where each cell's trees start. Trees are
+    # only ever numbers in these arrays, never objects of their own.
+    def __init__(self, x, y, radius, cell_size=10):
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        radius = np.asarray(radius, dtype=np.float64)
+
+        cell_x = np.floor(x / cell_size).astype(np.int64)
+        cell_y = np.floor(y / cell_size).astype(np.int64)
+        if len(x) > 0:
+            cell_left = int(cell_x.min())
+            cell_bottom = int(cell_y.min())
+            columns = int(cell_x.max()) - cell_left + 1
+            rows = int(cell_y.max()) - cell_bottom + 1
+        else:
+            (cell_left, cell_bottom, columns, rows) = (0, 0, 0, 0)
+
+        cells = (cell_x - cell_left) * rows + (cell_y - cell_bottom)
+        order = np.argsort(cells, kind='stable')
+        cell_start = np.searchsorted(cells[order], np.arange(columns * rows + 1))
+
+        self.set_arrays(
+            x[order],
+            y[order],
+            radius[order],
+            cell_start,
+            cell_size,
+            cell_left,
+            cell_bottom,
+            columns,
+            rows,
+            float(radius.max()) if len(x) > 0 else 0
+        )
+
+    @classmethod
+    def from_sorted(cls, x, y, radius, cell_start, cell_size, cell_left, cell_bottom, columns, rows, max_radius):
+        # For arrays already in cell order, such as a memory mapped course.
+        forest = cls.__new__(cls)
+        forest.set_arrays(x, y, radius, cell_start, cell_size, cell_left, cell_bottom, columns, rows, max_radius)
+        return forest
+
+    def set_arrays(self, x, y, radius, cell_start, cell_size, cell_left, cell_bottom, columns, rows, max_radius):
+        self.x = x
+        self.y = y
+        self.radius = radius
+        self.cell_start = cell_start
+        self.cell_size = cell_size
+        self.cell_left = cell_left
+        self.cell_bottom = cell_bottom
+        self.columns = columns
+        self.rows = rows
+        self.max_radius = max_radius
+
+        # Indexing a memoryview gives plain floats and ints, which the
+        # per-step collision search works on much faster than NumPy scalars.
+        self.x_values = memoryview(np.ascontiguousarray(x, dtype=np.float64))
+        self.y_values = memoryview(np.ascontiguousarray(y, dtype=np.float64))
+        self.radius_values = memoryview(np.ascontiguousarray(radius, dtype=np.float64))
+        self.cell_start_values = memoryview(np.ascontiguousarray(cell_start, dtype=np.int64))
+
+    def __len__(self):
+        return len(self.x)
+
+    def nbytes(self):
+        return self.x.nbytes + self.y.nbytes + self.radius.nbytes + self.cell_start.nbytes
+
+    def cell_range(self, left, bottom, right, top):
+        # Columns and rows of the cells a tree reaching into the rectangle
+        # could be centered in, clipped to the grid.
+        column_left = max(math.floor((left - self.max_radius) / self.cell_size) - self.cell_left, 0)
+        column_right = min(math.floor((right + self.max_radius) / self.cell_size) - self.cell_left, self.columns - 1)
+        row_bottom = max(math.floor((bottom - self.max_radius) / self.cell_size) - self.cell_bottom, 0)
+        row_top = min(math.floor((top + self.max_radius) / self.cell_size) - self.cell_bottom, self.rows - 1)
+        return (column_left, column_right, row_bottom, row_top)
+
+    def first_swept_hit(self, disc, dx, dy):
+        # The tree the disc touches first while moving by (dx, dy), as
+        # (t, index), or None. Ties go to the lowest index.
+        (column_left, column_right, row_bottom, row_top) = self.cell_range(
+            min(disc.x, disc.x + dx) - disc.radius,
+            min(disc.y, disc.y + dy) - disc.radius,
+            max(disc.x, disc.x + dx) + disc.radius,
+            max(disc.y, disc.y + dy) + disc.radius
+        )
+        # Nothing to search with the disc off the grid on any side.
+        if column_left > column_right or row_bottom > row_top:
+            return None
+
+        xs = self.x_values
+        ys = self.y_values
+        radii = self.radius_values
+        cell_start = self.cell_start_values
+
+        # A column's cells are contiguous.
+        hit = None
+        for column in range(column_left, column_right + 1):
+            first = column * self.rows
+            for index in range(cell_start[first + row_bottom], cell_start[first + row_top + 1]):
+                t = offset_impact(disc.x - xs[index], disc.y - ys[index], disc.radius + radii[index], dx, dy)
+                if t is not None and (hit is None or t < hit[0]):
+                    hit = (t, index)
+
+        return hit
+
+    def query(self, left, bottom, right, top):
+        # Indices of the trees whose circle reaches into the rectangle, in
+        # ascending order.
+        (column_left, column_right, row_bottom, row_top) = self.cell_range(left, bottom, right, top)
+        if column_left > column_right or row_bottom > row_top:
+            return np.zeros(0, dtype=np.int64)
+
+        columns = np.arange(column_left, column_right + 1) * self.rows
+        starts = self.cell_start[columns + row_bottom]
+        counts = self.cell_start[columns + row_top + 1] - starts
+        total = int(counts.sum())
+        indices = np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(total)
+
+        x = self.x[indices]
+        y = self.y[indices]
+        radius = self.radius[indices]
+        inside = (x + radius >= left) & (x - radius <= right) & (y + radius >= bottom) & (y - radius <= top)
+        return indices[inside]
+
+    def trees_in(self, left, bottom, right, top):
+        # x, y and radius arrays of the trees reaching into the rectangle.
+        indices = self.query(left, bottom, right, top)
+        return (self.x[indices], self.y[indices], self.radius[indices])
+
+    def impacts(self, x, y, dx, dy, radius):
+        # When each of a batch of discs first touches a tree while moving by
+        # (dx, dy), as a fraction of the move, or inf if it touches none.
+        impact = np.full(len(x), np.inf)
+        if len(self.x) == 0 or len(x) == 0:
+            return impact
+
+        reach = radius + self.max_radius
+        cell_left = np.floor((np.minimum(x, x + dx) - reach) / self.cell_size).astype(np.int64) - self.cell_left
+        cell_right = np.floor((np.maximum(x, x + dx) + reach) / self.cell_size).astype(np.int64) - self.cell_left
+        cell_bottom = np.floor((np.minimum(y, y + dy) - reach) / self.cell_size).astype(np.int64) - self.cell_bottom
+        cell_top = np.floor((np.maximum(y, y + dy) + reach) / self.cell_size).astype(np.int64) - self.cell_bottom
+
+        # Every (disc, cell) pair in each disc's swept neighbourhood, in one go.
+        longest_move = max(float(np.abs(dx).max()), float(np.abs(dy).max()))
+        steps = np.arange(math.floor((2 * reach + longest_move) / self.cell_size) + 2)
+        cell_x = (cell_left[:, None] + steps)[:, :, None]
+        cell_y = (cell_bottom[:, None] + steps)[:, None, :]
+        inside = (cell_x <= cell_right[:, None, None]) & (cell_x >= 0) & (cell_x < self.columns)
+        inside = inside & (cell_y <= cell_top[:, None, None]) & (cell_y >= 0) & (cell_y < self.rows)
+        (discs, columns, rows) = np.nonzero(inside)
+        cells = cell_x[discs, columns, 0] * self.rows + cell_y[discs, 0, rows]
+
+        start = self.cell_start[cells]
+        counts = self.cell_start[cells + 1] - start
+        total = int(counts.sum())
+        if total == 0:
+            return impact
+
+        # Then every (disc, tree) pair in those cells.
+        pair_discs = np.repeat(discs, counts)
+        pair_trees = np.repeat(start - np.cumsum(counts) + counts, counts) + np.arange(total)
+        t = impact_times(
+            x[pair_discs],
+            y[pair_discs],
+            dx[pair_discs],
+            dy[pair_discs],
+            radius,
+            self.x[pair_trees],
+            self.y[pair_trees],
+            self.radius[pair_trees]
+        )
+        np.minimum.at(impact, pair_discs, t)
+        return impact
+
+
+class ChunkedForest:
+    # A forest with no edge, split into square chunks of chunk_size metres.
+    # Each chunk's trees are laid out from the seed and the chunk's own
+    # coordinates alone, the first time a query, a collision test or a
+    # drawing reaches it, and kept as a Forest of its own. The least
+    # recently used chunks are dropped once they take more than
+    # memory_budget bytes, and are laid out the same again if needed. The
+    # chunks are shared by the threads drawing and planning, so they're
+    # only looked up and dropped under a lock.
+    def __init__(self, seed, density, chunk_size=256, radii=(.25, 5), cell_size=10, memory_budget=64 * 1024 * 1024):
+        self.seed = seed
+        self.density = density
+        self.chunk_size = chunk_size
+        self.radii = radii
+        self.cell_size = cell_size
+        self.memory_budget = memory_budget
+        self.max_radius = radii[1]
+        self.memory = 0
+        self.chunks = OrderedDict()
+        self.generated = 0
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        # Only the trees in chunks laid out right now.
+        with self.lock:
+            return sum(len(chunk) for chunk in self.chunks.values())
+
+    def nbytes(self):
+        return self.memory
+
+    def lay_out(self, chunk_x, chunk_y):
+        # Negative coordinates wrap, as seed entropy can't be negative.
+        rng = np.random.default_rng([self.seed, chunk_x % 2 ** 32, chunk_y % 2 ** 32])
+        count = rng.poisson(self.density * self.chunk_size * self.chunk_size)
+        x = chunk_x * self.chunk_size + rng.uniform(0, self.chunk_size, count)
+        y = chunk_y * self.chunk_size + rng.uniform(0, self.chunk_size, count)
+        radius = rng.uniform(self.radii[0], self.radii[1], count)
+        return Forest(x, y, radius, self.cell_size)
+
+    def chunk(self, chunk_x, chunk_y):
+        key = (chunk_x, chunk_y)
+        with self.lock:
+            chunk = self.chunks.get(key)
+            if chunk is not None:
+                self.chunks.move_to_end(key)
+                return chunk
+
+            chunk = self.lay_out(chunk_x, chunk_y)
+            self.generated += 1
+            self.chunks[key] = chunk
+            self.memory += chunk.nbytes()
+            while self.memory > self.memory_budget and len(self.chunks) > 1:
+                (_, evicted) = self.chunks.popitem(last=False)
+                self.memory -= evicted.nbytes()
+
+        return chunk
+
+    def chunks_in(self, left, bottom, right, top):
+        # Every chunk a tree reaching into the rectangle could be in, in a
+        # fixed order, as ((chunk_x, chunk_y), Forest).
+        chunks = []
+        for chunk_x in range(
+            math.floor((left - self.max_radius) / self.chunk_size),
+            math.floor((right + self.max_radius) / self.chunk_size) + 1
+        ):
+            for chunk_y in range(
+                math.floor((bottom - self.max_radius) / self.chunk_size),
+                math.floor((top + self.max_radius) / self.chunk_size) + 1
+            ):
+                chunks.append(((chunk_x, chunk_y), self.chunk(chunk_x, chunk_y)))
+
+        return chunks
+
+    def first_swept_hit(self, disc, dx, dy):
+        # As Forest.first_swept_hit, with ((chunk_x, chunk_y), index) in
+        # place of the index.
+        hit = None
+        for (key, chunk) in self.chunks_in(
+            min(disc.x, disc.x + dx) - disc.radius,
+            min(disc.y, disc.y + dy) - disc.radius,
+            max(disc.x, disc.x + dx) + disc.radius,
+            max(disc.y, disc.y + dy) + disc.radius
+        ):
+            chunk_hit = chunk.first_swept_hit(disc, dx, dy)
+            if chunk_hit is not None and (hit is None or chunk_hit[0] < hit[0]):
+                hit = (chunk_hit[0], (key, chunk_hit[1]))
+
+        return hit
+
+    def trees_in(self, left, bottom, right, top):
+        trees = [chunk.trees_in(left, bottom, right, top) for (_, chunk) in self.chunks_in(left, bottom, right, top)]
+        return tuple(np.concatenate([tree[part] for tree in trees]) for part in range(3))
+
+    def impacts(self, x, y, dx, dy, radius):
+        # As Forest.impacts, testing each disc against the chunks around
+        # its move only.
+        impact = np.full(len(x), np.inf)
+        if len(x) == 0:
+            return impact
+
+        reach = radius + self.max_radius
+        chunk_left = np.floor((np.minimum(x, x + dx) - reach) / self.chunk_size).astype(np.int64)
+        chunk_right = np.floor((np.maximum(x, x + dx) + reach) / self.chunk_size).astype(np.int64)
+        chunk_bottom = np.floor((np.minimum(y, y + dy) - reach) / self.chunk_size).astype(np.int64)
+        chunk_top = np.floor((np.maximum(y, y + dy) + reach) / self.chunk_size).astype(np.int64)
+
+        # The chunks any disc reaches, without walking the space between
+        # discs that are far apart.
+        keys = set()
+        for column in range(int((chunk_right - chunk_left).max()) + 1):
+            for row in range(int((chunk_top - chunk_bottom).max()) + 1):
+                reached = (chunk_left + column <= chunk_right) & (chunk_bottom + row <= chunk_top)
+                keys.update(zip((chunk_left + column)[reached].tolist(), (chunk_bottom + row)[reached].tolist()))
+
+        for (chunk_x, chunk_y) in sorted(keys):
+            near = (chunk_left <= chunk_x) & (chunk_x <= chunk_right) & (chunk_bottom <= chunk_y) & (chunk_y <= chunk_top)
+            chunk_impact = self.chunk(chunk_x, chunk_y).impacts(x[near], y[near], dx[near], dy[near], radius)
+            impact[near] = np.minimum(impact[near], chunk_impact)
+
+        return impact
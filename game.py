@@ -0,0 +1,288 @@
+import argparse
+import json
+import math
+import random
+import time
+
+from course import HoleStatus, generate_chunked_course, generate_course, load_course
+from forest import Forest
+from physics import FIXED_DT, Disc, FlightSimulator, Throw, ThrowStatus
+
+
+LOG_VERSION = 1
+
+
+class Round:
+    # The rules of a round, free of pygame and of frame timing. Everything
+    # happens in fixed physics steps, inputs take effect before the step
+    # they were given at, and tree hits draw from a generator seeded with
+    # rng_seed, so a round is reproduced exactly by replaying its log.
+    def __init__(self, played, rng_seed=None, throw_class=Throw, disc_class=Disc, course_info=None):
+        if rng_seed is None:
+            rng_seed = random.randrange(2 ** 32)
+
+        self.course = played
+        self.forest = played.forest
+        self.rng_seed = rng_seed
+        self.throw_class = throw_class
+        self.disc_class = disc_class
+        self.simulator = FlightSimulator(self.forest, random.Random(rng_seed))
+        self.steps = 0
+        self.finished = False
+        self.angle = 0
+        self.space_bar_down = False
+        self.inputs = []
+        # Whatever is needed to lay the course out again on replay.
+        if course_info is None:
+            course_info = {'seed': played.seed, 'n_holes': len(played.holes), 'n_trees': len(played.forest)}
+        self.course_info = course_info
+
+        self.current_hole = 1
+        self.hole().status = HoleStatus.CURRENT
+        self.throw = self.tee_off()
+
+    def hole(self):
+        return self.course.holes[self.current_hole - 1]
+
+    def new_disc(self, x, y):
+        return self.disc_class(x, y, 0.12, (255, 0, 0), 7, 5, -2, 1)
+
+    def tee_off(self):
+        tee_pad = self.hole().tee_pad
+        return self.throw_class(1, self.new_disc(tee_pad.x, tee_pad.y), tee_pad.facing_angle)
+
+    def record(self, kind, *values):
+        self.inputs.append([self.steps, kind, *values])
+
+    def turn(self, delta):
+        self.angle = min(max(self.angle + delta, -1 * math.pi / 2), math.pi / 2)
+        self.record('angle', self.angle)
+
+    def press(self):
+        self.space_bar_down = True
+        self.record('press')
+
+    def release(self, power):
+        # Returns True if the throw was launched.
+        self.space_bar_down = False
+        if not self.throw.status == ThrowStatus.PLANNING:
+            return False
+
+        self.record('release', power)
+        self.throw.launch(self.angle, power)
+        return True
+
+    def reset(self):
+        self.record('reset')
+        self.throw = self.throw_class(1, self.new_disc(0, 0), math.pi / 2)
+
+    def set_forest(self, forest):
+        # For a course whose trees are still coming in. Not logged, since
+        # replays lay the whole course out first, so the round mustn't step
+        # until the last forest is set.
+        self.forest = forest
+        self.simulator.forest = forest
+
+    def practice(self, seed):
+        # A small random practice area around the origin, like reset.
+        self.record('practice', seed)
+        rng = random.Random(seed)
+        (xs, ys, radii) = ([], [], [])
+        for _ in range(0, rng.randint(10, 100)):
+            xs.append(rng.uniform(-100, 100))
+            ys.append(rng.uniform(-200, 10))
+            radii.append(rng.uniform(.25, 5))
+        self.set_forest(Forest(xs, ys, radii))
+        self.throw = self.throw_class(1, self.new_disc(0, 0), math.pi / 2)
+
+    def apply(self, entry):
+        # Replays one recorded input.
+        (kind, values) = (entry[1], entry[2:])
+        if kind == 'angle':
+            self.angle = values[0]
+            self.record('angle', self.angle)
+        elif kind == 'press':
+            self.press()
+        elif kind == 'release':
+            self.release(values[0])
+        elif kind == 'reset':
+            self.reset()
+        elif kind == 'practice':
+            self.practice(values[0])
+        else:
+            raise ValueError(f'Unknown input {kind!r} in round log')
+
+    def step(self):
+        if self.finished:
+            return
+
+        hole = self.hole()
+        if self.simulator.step(self.throw, hole.basket):
+            hole.status = HoleStatus.COMPLETE
+            hole.score = self.throw.count
+            self.angle = 0
+            if self.current_hole == len(self.course.holes):
+                self.finished = True
+            else:
+                self.current_hole += 1
+                self.hole().status = HoleStatus.CURRENT
+                self.throw = self.tee_off()
+
+        elif self.throw.status == ThrowStatus.COMPLETE:
+            self.angle = 0
+            disc = self.throw.disc
+            facing_angle = math.atan2((hole.basket.y - disc.y), (hole.basket.x - disc.x))
+            self.throw = self.throw_class(self.throw.count + 1, disc, facing_angle)
+
+        self.steps += 1
+
+    def advance(self, seconds):
+        # Real time play, on the simulator's clock.
+        for _ in self.simulator.clock.steps(seconds):
+            self.step()
+
+    def alpha(self):
+        return self.simulator.alpha()
+
+    def scores(self):
+        return [hole.score for hole in self.course.holes]
+
+    def log(self):
+        return {
+            'version': LOG_VERSION,
+            'course': self.course_info,
+            'rng_seed': self.rng_seed,
+            'dt': self.simulator.dt,
+            'steps': self.steps,
+            'inputs': self.inputs,
+            'scores': self.scores(),
+            'disc': [self.throw.disc.x, self.throw.disc.y]
+        }
+
+
+def save_log(game_round, path):
+    with open(path, 'w') as log_file:
+        json.dump(game_round.log(), log_file, separators=(',', ':'))
+
+
+def load_log(path):
+    with open(path) as log_file:
+        log = json.load(log_file)
+
+    if log.get('version') != LOG_VERSION:
+        raise ValueError(f'{path} is not a version {LOG_VERSION} round log')
+
+    return log
+
+
+def course_from_info(info, **classes):
+    # Lays a course out again from Round.course_info.
+    if info.get('path') is not None:
+        return load_course(info['path'], **classes)
+    if info.get('tree_density') is not None:
+        return generate_chunked_course(info['seed'], info.get('n_holes', 18), info['tree_density'], **classes)
+
+    return generate_course(info['seed'], info.get('n_holes', 18), info.get('n_trees', 10000), **classes)
+
+
+def reset_holes(played):
+    # Ready to play a course again from the first hole.
+    for hole in played.holes:
+        hole.status = HoleStatus.UPCOMING
+        hole.score = None
+
+
+def replay(log, played=None, before_input=None):
+    # Runs a logged round start to finish with no rendering and no clock.
+    # before_input(round, entry) is called before each input is applied.
+    if played is None:
+        played = course_from_info(log['course'])
+    if log['dt'] != FIXED_DT:
+        raise ValueError(f'Round log was recorded at dt {log["dt"]}')
+
+    game_round = Round(played, log['rng_seed'], course_info=log['course'])
+    inputs = log['inputs']
+    next_input = 0
+    for step in range(log['steps']):
+        while next_input < len(inputs) and inputs[next_input][0] == step:
+            if before_input is not None:
+                before_input(game_round, inputs[next_input])
+            game_round.apply(inputs[next_input])
+            next_input += 1
+        game_round.step()
+
+    return game_round
+
+
+def recorded_throws(log, played=None):
+    # Every throw launched on the course in a logged round, found by
+    # replaying it, with the state of the round's generator and of its
+    # time ignoring trees, both of which carry over between throws, as the
+    # disc left. A DiscPool given the same state flies the throw exactly
+    # again. Throws in practice areas are left out.
+    throws = []
+
+    def before_input(game_round, entry):
+        throw = game_round.throw
+        if entry[1] != 'release' or throw.status != ThrowStatus.PLANNING:
+            return
+        if game_round.forest is not game_round.course.forest:
+            return
+
+        throws.append({
+            'hole': game_round.current_hole,
+            'count': throw.count,
+            'x': throw.disc.x,
+            'y': throw.disc.y,
+            'facing_angle': throw.facing_angle,
+            'angle': game_round.angle,
+            'power': entry[2],
+            'rng_state': game_round.simulator.rng.getstate(),
+            'recent_tree_hit': game_round.simulator.recent_tree_hit,
+            'invincible_time': game_round.simulator.invincible_disc_time,
+            'invincible_time_limit': game_round.simulator.invincible_disc_time_limit
+        })
+
+    replay(log, played, before_input)
+    return throws
+
+
+def matches(log, game_round):
+    # True if the replay ended exactly where the recording did.
+    return game_round.scores() == log['scores'] and [game_round.throw.disc.x, game_round.throw.disc.y] == log['disc']
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay recorded rounds headless')
+    parser.add_argument('logs', nargs='+', help='round logs saved with main.py --record')
+    args = parser.parse_args()
+
+    # Courses are cached by how they were made, since replays of the same
+    # course are common and laying one out costs more than most rounds.
+    courses = {}
+    mismatched = 0
+    steps = 0
+    start = time.perf_counter()
+    for path in args.logs:
+        log = load_log(path)
+        key = json.dumps(log['course'], sort_keys=True)
+        if key not in courses:
+            courses[key] = course_from_info(log['course'])
+        reset_holes(courses[key])
+
+        game_round = replay(log, courses[key])
+        steps += game_round.steps
+        if not matches(log, game_round):
+            mismatched += 1
+            print(f'{path}: MISMATCH, recorded {log["scores"]}, replayed {game_round.scores()}')
+        else:
+            print(f'{path}: {game_round.scores()}')
+
+    seconds = time.perf_counter() - start
+    print(f'{len(args.logs)} rounds, {mismatched} mismatched, {steps} steps in {seconds:.2f}s')
+    print(f'{steps * FIXED_DT / max(seconds, 1e-9):.0f}x real time')
+    return 1 if mismatched > 0 else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -1,13 +1,45 @@
-from enum import Enum
+import argparse
+from collections import OrderedDict
 import math
+import numpy as np
 import pygame
 import random
+import threading
 
+import batch
+import course
+import crowd
+import physics
+from caddie import Caddie
+from course import CourseGenerator, generate_chunked_course, load_course, save_course
+from game import Round, save_log
+from profiler import FrameProfiler
 
-pygame.init()
 
+background_colour = (255,255,255)
 
-AIR_DRAG = 0.996
+# Phases of a frame the profiler times, in the order they're reported.
+PROFILE_PHASES = (
+    'events',
+    'physics',
+    'static',
+    'trees',
+    'holes',
+    'trail',
+    'player',
+    'disc',
+    'direction_hud',
+    'power_hud',
+    'score_card_hud',
+    'basket_pointer_hud',
+    'tee_pad_pointer_hud',
+    'crowd',
+    'caddie_hud',
+    'disc_pointer_hud',
+    'loading_hud',
+    'profiler',
+    'flip'
+)
 
 
 class ViewPort:
@@ -19,120 +51,88 @@ class ViewPort:
         self.y = y
         self.zoom = zoom
 
+    def world_bounds(self):
+        left = self.x - ((self.width / 2) * self.zoom)
+        right = self.x + ((self.width / 2) * self.zoom)
+        top = self.y + ((self.height / 2) * self.zoom)
+        bottom = self.y - ((self.height / 2) * self.zoom)
 
-class Disc:
-    def __init__(self, x, y, radius, color, speed, glide, turn, fade):
-        self.velocity_angle = 0
-        self.velocity = 0
-        self.x = x
-        self.y = y
-        self.radius = radius
-        self.color = color
-        self.speed = speed
-        self.glide = glide
-        self.turn = turn
-        self.fade = fade
-        self.throw_distance = 0
+        return (left, bottom, right, top)
 
-    def display(self, view_port):
-        view_x = (self.x - view_port.x) / view_port.zoom + (view_port.width // 2)
-        view_y = -1 * ((self.y - view_port.y) / view_port.zoom) + (view_port.height // 2)
+
+class Disc(physics.Disc):
+    def display(self, view_port, alpha=1):
+        (x, y) = self.interpolate(alpha)
+        view_x = (x - view_port.x) / view_port.zoom + (view_port.width // 2)
+        view_y = -1 * ((y - view_port.y) / view_port.zoom) + (view_port.height // 2)
         view_radius = self.radius / view_port.zoom
-        pygame.draw.circle(view_port.screen, self.color, (view_x, view_y), view_radius)
+        return pygame.draw.circle(view_port.screen, self.color, (view_x, view_y), view_radius)
 
-    def update(self, ticks):
-        seconds = ticks / 1000
 
-        self.y += math.sin(self.velocity_angle) * self.velocity * seconds        
-        self.x += math.cos(self.velocity_angle) * self.velocity * seconds
-        
-        # Low velocity fade
-        if self.velocity < 10 and self.velocity > 0.1:
-            self.velocity_angle += (math.pi / 4) * .25 * ((self.fade + 1) / 6) * seconds
+class DiscPool(batch.DiscPool):
+    # Every disc in the pool is drawn in one blits call, from a sprite made
+    # once per tag and pixel size.
+    colors = {crowd.COMPANION: (0, 0, 255, 255), crowd.GHOST: (96, 96, 96, 110)}
 
-        # High velocity turn
-        if self.velocity > 20:
-            self.velocity_angle -= (math.pi / 4) * .25 * ((-1 * self.turn + 2) / 7) * seconds
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.sprites = {}
 
-        self.velocity *= AIR_DRAG
+    def sprite(self, tag, size, view_radius):
+        key = (tag, size)
+        sprite = self.sprites.get(key)
+        if sprite is None:
+            sprite = pygame.Surface((2 * size, 2 * size), pygame.SRCALPHA)
+            pygame.draw.circle(sprite, self.colors.get(tag, (255, 0, 0, 255)), (size, size), max(view_radius, 1))
+            self.sprites[key] = sprite
 
+        return sprite
 
-class ThrowStatus(Enum):
-    PLANNING = 1
-    FLYING = 2
-    COMPLETE = 3
+    def display(self, view_port, alpha=1):
+        if len(self) == 0:
+            return None
 
-
-class Throw:
+        (x, y) = self.interpolate(alpha)
+        view_x = (x - view_port.x) / view_port.zoom + (view_port.width // 2)
+        view_y = -1 * ((y - view_port.y) / view_port.zoom) + (view_port.height // 2)
+        view_radius = self.radius / view_port.zoom
+        size = max(1, math.ceil(view_radius))
+        shown = (view_x + size >= 0) & (view_x - size < view_port.width) & (view_y + size >= 0) & (view_y - size < view_port.height)
+
+        sprites = {}
+        blits = []
+        for (left, top, tag) in zip(
+            (view_x[shown] - size).round().tolist(),
+            (view_y[shown] - size).round().tolist(),
+            self.tag[:self.count][shown].tolist()
+        ):
+            if tag not in sprites:
+                sprites[tag] = self.sprite(tag, size, view_radius)
+            blits.append((sprites[tag], (left, top)))
+        if len(blits) == 0:
+            return None
+
+        rects = view_port.screen.blits(blits)
+        return rects[0].unionall(rects[1:])
+
+
+class Throw(physics.Throw):
     def __init__(self, count, disc, facing_angle):
-        self.count = count
-        self.disc = disc
-        self.status = ThrowStatus.PLANNING
-        self.flight_path = []
-        self.distance = 0
-        self.facing_angle = facing_angle
-        self.starting_x = disc.x
-        self.starting_y = disc.y
-
-    def update(self, ticks):
-        if not self.status == ThrowStatus.FLYING:
-            return
-
-        seconds = ticks / 1000
-
-        self.distance += self.disc.velocity * seconds
-
-        if self.disc.velocity < 0.5:
-            self.status = ThrowStatus.COMPLETE
-            self.disc.velocity = 0
-
-        if self.disc.velocity > 0:
-            self.flight_path.append((self.disc.x, self.disc.y))
-    
-        self.disc.update(ticks)
+        super().__init__(count, disc, facing_angle)
+        self.trail_layer = TrailLayer()
 
-    def display(self, view_port, hud_angle):
-        for fp in self.flight_path:
-            view_x = (fp[0] - view_port.x) / view_port.zoom + (view_port.width // 2)
-            view_y = -1 * ((fp[1] - view_port.y) / view_port.zoom) + (view_port.height // 2)
-            view_radius = self.disc.radius / view_port.zoom
-            pygame.draw.circle(view_port.screen, (0, 0, 255), (view_x, view_y), view_radius)
-
-        # Draw the "player"
+    def display_player(self, view_port, hud_angle):
         view_width = 1 / view_port.zoom
         view_height = 0.2 / view_port.zoom
-        rect_surf = pygame.Surface((view_width, view_height), pygame.SRCALPHA)
-        rect_surf.fill((128, 128, 128))
-        rotated = pygame.transform.rotate(rect_surf, math.degrees(self.facing_angle + hud_angle - math.pi / 2))
+        rotated = sprite_cache.rotated_rect(view_width, view_height, (128, 128, 128), math.degrees(self.facing_angle + hud_angle - math.pi / 2))
         view_left = (self.starting_x - view_port.x) / view_port.zoom + (view_port.width // 2)
         view_top = -1 * ((self.starting_y - view_port.y) / view_port.zoom) + (view_port.height // 2)
         rotated_rect = rotated.get_rect()
         view_rect = pygame.Rect(view_left, view_top, view_width, view_height)
-        view_port.screen.blit(rotated, view_rect)
-
-        # Draw the disc
-        self.disc.display(view_port) 
-
-
-class Tree:
-    def __init__(self, x, y, radius):
-        self.x = x
-        self.y = y
-        self.radius = radius
-
-    def display(self, view_port):
-        view_x = (self.x - view_port.x) / view_port.zoom + (view_port.width // 2)
-        view_y = -1 * ((self.y - view_port.y) / view_port.zoom) + (view_port.height // 2)
-        view_radius = self.radius / view_port.zoom
-        pygame.draw.circle(view_port.screen, (0, 255, 0), (view_x, view_y), view_radius)
-
+        return view_port.screen.blit(rotated, view_rect)
 
-class Basket:
-    def __init__(self, x, y):
-        self.x = x
-        self.y = y
-        self.radius = 0.27051
 
+class Basket(course.Basket):
     def display(self, view_port):
         view_x = (self.x - view_port.x) / view_port.zoom + (view_port.width // 2)
         view_y = -1 * ((self.y - view_port.y) / view_port.zoom) + (view_port.height // 2)
@@ -140,18 +140,11 @@ class Basket:
         pygame.draw.circle(view_port.screen, (145, 145, 145), (view_x, view_y), view_radius)
 
 
-class TeePad:
-    def __init__(self, x, y, facing_angle):
-        self.x = x
-        self.y = y
-        self.facing_angle = facing_angle
-
+class TeePad(course.TeePad):
     def display(self, view_port):
         view_width = 1.5 / view_port.zoom
         view_height = 3 / view_port.zoom
-        rect_surf = pygame.Surface((view_width, view_height), pygame.SRCALPHA)
-        rect_surf.fill((0, 0, 0))
-        rotated = pygame.transform.rotate(rect_surf, math.degrees(self.facing_angle - math.pi / 2))
+        rotated = sprite_cache.rotated_rect(view_width, view_height, (0, 0, 0), math.degrees(self.facing_angle - math.pi / 2))
         view_left = (self.x - view_port.x) / view_port.zoom + (view_port.width // 2)
         view_top = -1 * ((self.y - view_port.y) / view_port.zoom) + (view_port.height // 2)
         rotated_rect = rotated.get_rect()
@@ -159,69 +152,102 @@ class TeePad:
         view_port.screen.blit(rotated, view_rect)
 
 
-class HoleStatus(Enum):
-    UPCOMING = 1
-    CURRENT = 2
-    COMPLETE = 3
-
-
-class Hole:
-    def __init__(self, number, tee_pad, basket):
-        self.number = number
-        self.tee_pad = tee_pad
-        self.basket = basket
-        meters = math.dist((tee_pad.x, tee_pad.y), (basket.x, basket.y))
-        self.distance =  int(meters * 3.28084) # Meters to feet with decimal removed.
-        if meters < 75:
-            self.par = 2
-        elif meters < 175:
-            self.par = 3
-        elif meters < 320:
-            self.par = 4
-        elif meters < 400:
-            self.par = 5
-        else:
-            self.par = 6
+class TextCache:
+    # Rendered text kept by string and colour so each label is rasterized
+    # once. The font is loaded on first use, after pygame.init().
+    def __init__(self, name='freemono', size=18, max_entries=1024):
+        self.name = name
+        self.size = size
+        self.max_entries = max_entries
+        self.font = None
+        self.surfaces = OrderedDict()
+
+    def render(self, text, color=(0, 0, 0)):
+        key = (text, color)
+        surface = self.surfaces.get(key)
+        if surface is not None:
+            self.surfaces.move_to_end(key)
+            return surface
+
+        if self.font is None:
+            self.font = pygame.font.SysFont(self.name, self.size)
+
+        surface = self.font.render(text, True, color)
+        self.surfaces[key] = surface
+        if len(self.surfaces) > self.max_entries:
+            self.surfaces.popitem(last=False)
+
+        return surface
+
+
+class SpriteCache:
+    # Filled rectangles rotated to an angle, kept by pixel size, colour and
+    # angle rounded to angle_step degrees, so a steady frame allocates no
+    # surfaces. The least recently used are dropped past max_entries.
+    def __init__(self, max_entries=256, angle_step=1):
+        self.max_entries = max_entries
+        self.angle_step = angle_step
+        self.sprites = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def rotated_rect(self, width, height, color, degrees):
+        size = (int(width), int(height))
+        steps = round(degrees / self.angle_step) % round(360 / self.angle_step)
+        key = (size, color, steps)
+        sprite = self.sprites.get(key)
+        if sprite is not None:
+            self.hits += 1
+            self.sprites.move_to_end(key)
+            return sprite
+
+        self.misses += 1
+        rect_surf = pygame.Surface(size, pygame.SRCALPHA)
+        rect_surf.fill(color)
+        sprite = pygame.transform.rotate(rect_surf, steps * self.angle_step)
+        self.sprites[key] = sprite
+        if len(self.sprites) > self.max_entries:
+            self.sprites.popitem(last=False)
+
+        return sprite
 
-        self.status = HoleStatus.UPCOMING
-        self.score = None
 
-    def bounding_rect(self):
-        most_left = min(self.tee_pad.x, self.basket.x)
-        most_top = min(self.tee_pad.y, self.basket.y)
-        most_right = max(self.tee_pad.x, self.basket.x)
-        most_bottom = max(self.tee_pad.y, self.basket.y)
-        
-        return pygame.Rect(most_left, most_top, most_right - most_left, most_bottom - most_top)
+class ScoreCardHUD:
+    # The card is drawn onto its own surface and only redrawn when a hole's
+    # score or status changes.
+    def __init__(self):
+        self.surface = None
+        self.key = None
 
+    def render(self, view_port, holes):
+        self.surface = pygame.Surface((view_port.width, 120), pygame.SRCALPHA)
 
-class ScoreCardHUD:
+        self.surface.blit(text_cache.render('Hole:'), (25, 40))
+        self.surface.blit(text_cache.render('Dist:'), (25, 60))
+        self.surface.blit(text_cache.render('Par:'), (25, 80))
+        self.surface.blit(text_cache.render('Score:'), (25, 100))
 
-    def display(self, view_port, holes):
         for hole in holes:
-            label = font.render('Hole:', True, (0, 0, 0))
-            view_port.screen.blit(label, (25, 40))
-            
-            hole_number = font.render(str(hole.number), True, (0, 0, 0))
-            view_port.screen.blit(hole_number, (45 + hole.number * 50, 40))
-            
-            label = font.render('Dist:', True, (0, 0, 0))
-            view_port.screen.blit(label, (25, 60))
-
-            hole_distance = font.render(str(hole.distance), True, (0, 0, 0))
-            view_port.screen.blit(hole_distance, (45 + hole.number * 50, 60))
-
-            label = font.render('Par:', True, (0, 0, 0))
-            view_port.screen.blit(label, (25, 80))
-
-            hole_distance = font.render(str(hole.par), True, (0, 0, 0))
-            view_port.screen.blit(hole_distance, (45 + hole.number * 50, 80))
-
-            label = font.render('Score:', True, (0, 0, 0))
-            view_port.screen.blit(label, (25, 100))
+            hole_number = text_cache.render(str(hole.number))
+            self.surface.blit(hole_number, (45 + hole.number * 50, 40))
+
+            hole_distance = text_cache.render(str(hole.distance))
+            self.surface.blit(hole_distance, (45 + hole.number * 50, 60))
+
+            hole_par = text_cache.render(str(hole.par))
+            self.surface.blit(hole_par, (45 + hole.number * 50, 80))
+
             if hole.score is not None:
-                hole_score = font.render(str(hole.score), True, (0, 0, 0))
-                view_port.screen.blit(hole_score, (45 + hole.number * 50, 100))
+                hole_score = text_cache.render(str(hole.score))
+                self.surface.blit(hole_score, (45 + hole.number * 50, 100))
+
+    def display(self, view_port, holes):
+        key = tuple((hole.number, hole.distance, hole.par, hole.score, hole.status) for hole in holes)
+        if self.surface is None or key != self.key or self.surface.get_width() != view_port.width:
+            self.render(view_port, holes)
+            self.key = key
+
+        return view_port.screen.blit(self.surface, (0, 0))
 
 
 class DirectionAngleHUD:
@@ -234,14 +260,15 @@ class DirectionAngleHUD:
         view_width = 100
         view_height = 100
         view_rect = pygame.Rect(view_left, view_top, view_width, view_height)
-        pygame.draw.rect(view_port.screen, (128, 128, 128), view_rect)
+        drawn_rect = pygame.draw.rect(view_port.screen, (128, 128, 128), view_rect)
 
         pygame.draw.arc(view_port.screen, (0, 0, 0), view_rect, 0, -1 * math.pi, width=2)
         
         center = view_rect.center
         end_pos = (center[0] - math.sin(self.angle) * 50, center[1] - math.cos(self.angle) * 50) 
 
-        pygame.draw.line(view_port.screen, (0, 0, 0), center, end_pos, width=2)
+        line_rect = pygame.draw.line(view_port.screen, (0, 0, 0), center, end_pos, width=2)
+        return drawn_rect.union(line_rect)
 
 
 class PowerHUD:
@@ -264,7 +291,7 @@ class PowerHUD:
         view_width = 600
         view_height = 100
         view_rect = pygame.Rect(view_left, view_top, view_width, view_height)
-        pygame.draw.rect(view_port.screen, (128, 128, 128), view_rect)
+        drawn_rect = pygame.draw.rect(view_port.screen, (128, 128, 128), view_rect)
 
         view_left = 150
         view_top = 650 
@@ -272,15 +299,13 @@ class PowerHUD:
         view_height = 100
         view_rect = pygame.Rect(view_left, view_top, view_width, view_height)
         pygame.draw.rect(view_port.screen, (255, 0, 0), view_rect)
+        return drawn_rect
 
 
 class BasketPointerHUD:
     def display(self, view_port, hole):
         # Is the basket on screen?
-        view_port_left = view_port.x - ((view_port.width / 2) * view_port.zoom)
-        view_port_right = view_port.x + ((view_port.width / 2) * view_port.zoom)
-        view_port_top = view_port.y + ((view_port.height / 2) * view_port.zoom)
-        view_port_bottom = view_port.y - ((view_port.height / 2) * view_port.zoom)
+        (view_port_left, view_port_bottom, view_port_right, view_port_top) = view_port.world_bounds()
 
         if hole.basket.x >= view_port_left and hole.basket.x <= view_port_right:
             if hole.basket.y >= view_port_bottom and hole.basket.y <= view_port_top:
@@ -291,17 +316,14 @@ class BasketPointerHUD:
         
         boop_x = view_port.width / 2 + math.cos(offscreen_angle) * (view_port.width / 2 - 150)
         boop_y = view_port.height / 2 - math.sin(offscreen_angle) * (view_port.height / 2 - 150)
-        pointer_label = font.render('Basket', True, (0, 0, 0))
-        view_port.screen.blit(pointer_label, (boop_x, boop_y))
+        pointer_label = text_cache.render('Basket')
+        return view_port.screen.blit(pointer_label, (boop_x, boop_y))
 
 
 class TeePadPointerHUD:
     def display(self, view_port, hole):
         # Is the tee pad on screen?
-        view_port_left = view_port.x - ((view_port.width / 2) * view_port.zoom)
-        view_port_right = view_port.x + ((view_port.width / 2) * view_port.zoom)
-        view_port_top = view_port.y + ((view_port.height / 2) * view_port.zoom)
-        view_port_bottom = view_port.y - ((view_port.height / 2) * view_port.zoom)
+        (view_port_left, view_port_bottom, view_port_right, view_port_top) = view_port.world_bounds()
 
         if hole.tee_pad.x >= view_port_left and hole.tee_pad.x <= view_port_right:
             if hole.tee_pad.y >= view_port_bottom and hole.tee_pad.y <= view_port_top:
@@ -312,17 +334,14 @@ class TeePadPointerHUD:
         
         boop_x = view_port.width / 2 + math.cos(offscreen_angle) * (view_port.width / 2 - 150)
         boop_y = view_port.height / 2 - math.sin(offscreen_angle) * (view_port.height / 2 - 150)
-        pointer_label = font.render('Tee Pad', True, (0, 0, 0))
-        view_port.screen.blit(pointer_label, (boop_x, boop_y))
+        pointer_label = text_cache.render('Tee Pad')
+        return view_port.screen.blit(pointer_label, (boop_x, boop_y))
 
 
 class DiscPointerHUD:
     def display(self, view_port, disc):
         # Is the tee pad on screen?
-        view_port_left = view_port.x - ((view_port.width / 2) * view_port.zoom)
-        view_port_right = view_port.x + ((view_port.width / 2) * view_port.zoom)
-        view_port_top = view_port.y + ((view_port.height / 2) * view_port.zoom)
-        view_port_bottom = view_port.y - ((view_port.height / 2) * view_port.zoom)
+        (view_port_left, view_port_bottom, view_port_right, view_port_top) = view_port.world_bounds()
 
         if disc.x >= view_port_left and disc.x <= view_port_right:
             if disc.y >= view_port_bottom and disc.y <= view_port_top:
@@ -333,222 +352,765 @@ class DiscPointerHUD:
         
         boop_x = view_port.width / 2 + math.cos(offscreen_angle) * (view_port.width / 2 - 180)
         boop_y = view_port.height / 2 - math.sin(offscreen_angle) * (view_port.height / 2 - 180)
-        pointer_label = font.render('Disc', True, (0, 0, 0))
-        view_port.screen.blit(pointer_label, (boop_x, boop_y))
+        pointer_label = text_cache.render('Disc')
+        return view_port.screen.blit(pointer_label, (boop_x, boop_y))
 
 
-def collide(p1, p2):
-    dx = p1.x - p2.x
-    dy = p1.y - p2.y
-    
-    distance = math.hypot(dx, dy)
-    if distance < p1.radius + p2.radius:
-        return True
+class LoadingHUD:
+    def display(self, view_port, generator):
+        # Shown while the course's trees are still being generated.
+        if generator is None:
+            return
+
+        label = text_cache.render(f'Growing trees {generator.grown}/{generator.n_trees}')
+        return view_port.screen.blit(label, ((view_port.width - label.get_width()) // 2, 130))
+
+
+class CaddieHUD:
+    # The caddie's plan for the throw waiting to be made, toggled with H:
+    # which way to turn and what power to throw at, and a ring where the
+    # disc should come to rest. New lies are planned on a background
+    # thread, so frames keep coming while the caddie thinks.
+    def __init__(self, caddie):
+        self.caddie = caddie
+        self.visible = False
+        self.throw = None
+        self.shot = None
+        self.error = None
+        self.thread = None
 
-    return False
-
-holes_most_left = None
-holes_most_right = None
-holes_most_top = None
-holes_most_bottom = None
-holes = []
-for hole_number in range(1, 19):
-    while True:
-        if len(holes) == 0:
-            tee_pad = TeePad(0, 0, random.uniform(0, 2 * math.pi))
+    def toggle(self):
+        self.visible = not self.visible
+
+    def update(self, throw, hole, forest):
+        if not self.visible or throw.status != physics.ThrowStatus.PLANNING or throw is self.throw:
+            return
+        # The caddie plans one lie at a time.
+        if self.thread is not None and self.thread.is_alive():
+            return
+
+        self.caddie.set_forest(forest)
+        self.throw = throw
+        self.shot = None
+        self.error = None
+
+        # A failed plan is shown rather than left thinking, and raised on
+        # for the thread's traceback.
+        def plan():
+            try:
+                self.shot = self.caddie.plan_throw(throw, hole)
+            except Exception as error:
+                self.error = error
+                raise
+
+        self.thread = threading.Thread(target=plan, name='caddie', daemon=True)
+        self.thread.start()
+
+    def key(self, throw):
+        planning = self.visible and throw.status == physics.ThrowStatus.PLANNING
+        if not (planning and throw is self.throw):
+            return (planning, None, None)
+        error = self.error
+        return (planning, self.shot, None if error is None else f'{type(error).__name__}: {error}')
+
+    def display(self, view_port, throw):
+        (planning, shot, error) = self.key(throw)
+        if not planning:
+            return
+
+        if error is not None:
+            return view_port.screen.blit(text_cache.render(f'Caddie failed: {error}'), (780, 655))
+
+        if shot is None:
+            return view_port.screen.blit(text_cache.render('Caddie: thinking...'), (780, 655))
+
+        # In presses of the arrow keys, as the direction HUD turns.
+        turns = round(shot.angle / (math.pi / 64))
+        if turns == 0:
+            aim = 'straight'
         else:
-            previous_hole = holes[-1]
-            tee_pad = TeePad(
-                previous_hole.basket.x + random.uniform(-30, 30),
-                previous_hole.basket.y + random.uniform(-30, 30),
-                random.uniform(0, 2 * math.pi)
+            aim = f'{abs(turns)} {"left" if turns > 0 else "right"}'
+        if shot.in_basket:
+            outcome = 'in the basket'
+        else:
+            outcome = f'{shot.distance:.0f} m out{" off a tree" if shot.tree_hit else ""}'
+
+        drawn_rect = view_port.screen.blit(text_cache.render(f'Caddie: {aim}, power {shot.power}'), (780, 655))
+        drawn_rect = drawn_rect.union(view_port.screen.blit(text_cache.render(outcome), (780, 680)))
+        # Where a throw off a tree ends up is down to chance.
+        if not shot.tree_hit:
+            view_x = (shot.x - view_port.x) / view_port.zoom + (view_port.width // 2)
+            view_y = -1 * ((shot.y - view_port.y) / view_port.zoom) + (view_port.height // 2)
+            view_radius = max(1 / view_port.zoom, 6)
+            drawn_rect = drawn_rect.union(
+                pygame.draw.circle(view_port.screen, (255, 255, 0), (view_x, view_y), view_radius, width=2)
             )
 
-        # Place the basket down range from the tee pad
-        random_adjust_angle = random.uniform(-1 * math.pi / 4, math.pi / 4)
-        distance = random.uniform(30, 427)
-        basket_x = math.cos(tee_pad.facing_angle + random_adjust_angle) * distance
-        basket_y = math.sin(tee_pad.facing_angle + random_adjust_angle) * distance
-        basket = Basket(tee_pad.x + basket_x, tee_pad.y + basket_y)
-
-        hole = Hole(hole_number, tee_pad, basket)
-        
-        if hole.bounding_rect().collideobjects(holes, key=lambda o: o.bounding_rect()) is None:
-            bounding_rect = hole.bounding_rect()
-            if len(holes) == 0:
-                holes_most_left = bounding_rect.left
-                holes_most_right = bounding_rect.right
-                holes_most_top = bounding_rect.top
-                holes_most_bottom = bounding_rect.bottom
-            else:
-                holes_most_left = min(holes_most_left, bounding_rect.left)
-                holes_most_right = max(holes_most_right, bounding_rect.right)
-                holes_most_top = min(holes_most_top, bounding_rect.top)
-                holes_most_bottom = max(holes_most_bottom, bounding_rect.bottom)
+        return drawn_rect
+
+
+class TreeRasterizer:
+    # Fills the tree circles in view with a few NumPy passes straight into
+    # the surface's pixels, instead of a pygame.draw.circle call per tree.
+    # Each whole pixel radius has a stencil of the pixels pygame.draw.circle
+    # itself fills for it, taken from a circle it drew, so the output is
+    # the same pixel for pixel. Trees are stamped a radius at a time into
+    # the surface's pixel buffer as a flat array. The few trees crossing
+    # the edge of the surface's clip, circles wider than max_radius, and
+    # surfaces whose pixels can't be referenced as an array still go
+    # through pygame.draw.circle.
+    def __init__(self, max_radius=8, vectorized=True):
+        self.max_radius = max_radius
+        self.vectorized = vectorized
+        self.stencils = {}
+
+    def stencil(self, radius):
+        # The (x, y) offsets from the center of each pixel a circle of
+        # radius fills.
+        stencil = self.stencils.get(radius)
+        if stencil is None:
+            center = radius + 2
+            scratch = pygame.Surface((2 * center, 2 * center), 0, 32)
+            pygame.draw.circle(scratch, (255, 255, 255), (center, center), radius)
+            (offset_x, offset_y) = np.nonzero(pygame.surfarray.array2d(scratch))
+            stencil = (offset_x - center, offset_y - center)
+            self.stencils[radius] = stencil
+
+        return stencil
+
+    def draw(self, surface, color, x, y, radius):
+        # x, y and radius are arrays in pixels. pygame.draw.circle truncates
+        # each of them toward zero and draws nothing under a pixel across.
+        center_x = x.astype(np.int64)
+        center_y = y.astype(np.int64)
+        pixel_radius = radius.astype(np.int64)
+        drawn = pixel_radius >= 1
+        stamped = drawn & (pixel_radius <= self.max_radius) if self.vectorized else np.zeros(len(x), dtype=bool)
+
+        pixels = None
+        if stamped.any():
+            try:
+                pixels = pygame.surfarray.pixels2d(surface)
+            except ValueError:
+                stamped[:] = False
+
+        if pixels is not None:
+            (step_x, step_y) = (stride // pixels.itemsize for stride in pixels.strides)
+            (width, height) = pixels.shape
+            flat = np.lib.stride_tricks.as_strided(
+                pixels, shape=((height - 1) * step_y + (width - 1) * step_x + 1,), strides=(pixels.itemsize,)
+            )
+            value = pixels.dtype.type(surface.map_rgb(color))
+            # Only circles clear of the clip's edges are stamped, so no
+            # pixel needs checking.
+            clip = surface.get_clip()
+            stamped &= (
+                (center_x - pixel_radius > clip.left) & (center_x + pixel_radius < clip.right - 1)
+                & (center_y - pixel_radius > clip.top) & (center_y + pixel_radius < clip.bottom - 1)
+            )
+            for size in np.unique(pixel_radius[stamped]).tolist():
+                (offset_x, offset_y) = self.stencil(size)
+                group = stamped & (pixel_radius == size)
+                origin = center_x[group] * step_x + center_y[group] * step_y
+                flat[origin[:, None] + (offset_x * step_x + offset_y * step_y)] = value
+            # The surface stays locked while its pixels are referenced.
+            del flat
+            del pixels
+
+        rest = np.flatnonzero(drawn & ~stamped).tolist()
+        for (view_x, view_y, view_radius) in zip(x[rest].tolist(), y[rest].tolist(), radius[rest].tolist()):
+            pygame.draw.circle(surface, color, (view_x, view_y), view_radius)
+
+
+text_cache = TextCache()
+sprite_cache = SpriteCache()
+profiler = FrameProfiler(PROFILE_PHASES)
+tree_rasterizer = TreeRasterizer()
+
+
+def draw_trees(view_port, trees):
+    # Trees are only rows of the forest's arrays, so they are placed in view
+    # from those all at once rather than each being an object that draws
+    # itself.
+    (x, y, radius) = trees
+    view_x = (x - view_port.x) / view_port.zoom + (view_port.width // 2)
+    view_y = -1 * ((y - view_port.y) / view_port.zoom) + (view_port.height // 2)
+    view_radius = radius / view_port.zoom
+    tree_rasterizer.draw(view_port.screen, (0, 255, 0), view_x, view_y, view_radius)
+
+
+def draw_course(view_port, forest, holes):
+    view_port.screen.fill(background_colour)
+
+    (left, bottom, right, top) = view_port.world_bounds()
+    with profiler.phase('trees'):
+        draw_trees(view_port, forest.trees_in(left, bottom, right, top))
+
+    # Tee pads are drawn from their corner, so allow for their length.
+    reach = 4
+    with profiler.phase('holes'):
+        for hole in holes:
+            for item in (hole.basket, hole.tee_pad):
+                if left - reach <= item.x <= right + reach and bottom - reach <= item.y <= top + reach:
+                    item.display(view_port)
+
+
+class TilePyramid:
+    # Course tiles pre-rasterized at a few fixed zooms, like a map tile
+    # cache. Views at or above the smallest level zoom are assembled from
+    # the closest finer level, scaled down. Tiles are drawn on first use and
+    # the least recently used are dropped to stay under the memory budget.
+    def __init__(self, tile_size=256, level_zooms=(.125, .25, .5, 1), memory_budget=64 * 1024 * 1024):
+        self.tile_size = tile_size
+        self.level_zooms = sorted(level_zooms)
+        self.memory_budget = memory_budget
+        self.memory = 0
+        self.tiles = OrderedDict()
+
+    def clear(self):
+        self.tiles.clear()
+        self.memory = 0
+
+    def level_zoom(self, zoom):
+        finer = [level_zoom for level_zoom in self.level_zooms if level_zoom <= zoom]
+        if len(finer) == 0:
+            return None
+
+        return finer[-1]
+
+    def tile(self, level_zoom, tile_x, tile_y, forest, holes, screen):
+        key = (level_zoom, tile_x, tile_y)
+        tile = self.tiles.get(key)
+        if tile is not None:
+            self.tiles.move_to_end(key)
+            return tile
+
+        span = self.tile_size * level_zoom
+        tile = pygame.Surface((self.tile_size, self.tile_size), 0, screen)
+        tile_view_port = ViewPort(
+            self.tile_size,
+            self.tile_size,
+            tile,
+            (tile_x + 0.5) * span,
+            (tile_y + 0.5) * span,
+            level_zoom
+        )
+        draw_course(tile_view_port, forest, holes)
+
+        self.tiles[key] = tile
+        self.memory += tile.get_bytesize() * self.tile_size * self.tile_size
+        while self.memory > self.memory_budget and len(self.tiles) > 1:
+            (_, evicted) = self.tiles.popitem(last=False)
+            self.memory -= evicted.get_bytesize() * self.tile_size * self.tile_size
+
+        return tile
+
+    def display(self, view_port, forest, holes):
+        level_zoom = self.level_zoom(view_port.zoom)
+        span = self.tile_size * level_zoom
+        (left, bottom, right, top) = view_port.world_bounds()
+
+        def view_x(x):
+            return math.floor((x - view_port.x) / view_port.zoom + (view_port.width // 2))
+
+        def view_y(y):
+            return math.floor(-1 * ((y - view_port.y) / view_port.zoom) + (view_port.height // 2))
+
+        for tile_x in range(math.floor(left / span), math.floor(right / span) + 1):
+            for tile_y in range(math.floor(bottom / span), math.floor(top / span) + 1):
+                tile = self.tile(level_zoom, tile_x, tile_y, forest, holes, view_port.screen)
+
+                # Edges are snapped per tile so neighbours meet without seams.
+                view_left = view_x(tile_x * span)
+                view_right = view_x((tile_x + 1) * span)
+                view_top = view_y((tile_y + 1) * span)
+                view_bottom = view_y(tile_y * span)
+                size = (view_right - view_left, view_bottom - view_top)
+                if size[0] <= 0 or size[1] <= 0:
+                    continue
+
+                if size != tile.get_size():
+                    tile = pygame.transform.scale(tile, size)
+                view_port.screen.blit(tile, (view_left, view_top))
+
+
+class StaticLayer:
+    # Trees, baskets and tee pads never move, so they are drawn once onto a
+    # surface a margin larger than the screen and blitted at an offset until
+    # the view pans past the margin or the zoom changes.
+    def __init__(self, margin=256, tile_pyramid=None):
+        self.margin = margin
+        self.tile_pyramid = tile_pyramid
+        self.surface = None
+        self.cache_view_port = None
+
+    def invalidate(self):
+        self.surface = None
+        if self.tile_pyramid is not None:
+            self.tile_pyramid.clear()
+
+    def offset(self, view_port):
+        cache = self.cache_view_port
+        offset_x = (cache.x - view_port.x) / view_port.zoom + (view_port.width // 2) - (cache.width // 2)
+        offset_y = (view_port.y - cache.y) / view_port.zoom + (view_port.height // 2) - (cache.height // 2)
+        return (round(offset_x), round(offset_y))
+
+    def is_valid(self, view_port):
+        if self.surface is None:
+            return False
+
+        cache = self.cache_view_port
+        if cache.zoom != view_port.zoom:
+            return False
+        if cache.width != view_port.width + 2 * self.margin or cache.height != view_port.height + 2 * self.margin:
+            return False
+
+        (offset_x, offset_y) = self.offset(view_port)
+        return -2 * self.margin <= offset_x <= 0 and -2 * self.margin <= offset_y <= 0
+
+    def render(self, view_port, forest, holes):
+        width = view_port.width + 2 * self.margin
+        height = view_port.height + 2 * self.margin
+        if self.surface is None or self.surface.get_size() != (width, height):
+            self.surface = pygame.Surface((width, height), 0, view_port.screen)
+
+        cache = ViewPort(width, height, self.surface, view_port.x, view_port.y, view_port.zoom)
+        self.cache_view_port = cache
+        if self.tile_pyramid is not None and self.tile_pyramid.level_zoom(cache.zoom) is not None:
+            self.tile_pyramid.display(cache, forest, holes)
+        else:
+            draw_course(cache, forest, holes)
 
-            holes.append(hole)
-            break
+    def display(self, view_port, forest, holes):
+        if not self.is_valid(view_port):
+            self.render(view_port, forest, holes)
 
-trees = {}
-for i in range(0, 10000):
-    x = random.uniform(holes_most_left, holes_most_right)
-    y = random.uniform(holes_most_bottom, holes_most_top)
-    radius = random.uniform(.25, 5)
-    trees[i] = Tree(x, y, radius)
+        view_port.screen.blit(self.surface, self.offset(view_port))
 
-hole = holes[0]
-throw_drive = Throw(1, Disc(hole.tee_pad.x, hole.tee_pad.y, 0.12, (255, 0, 0), 7, 5, -2, 1), hole.tee_pad.facing_angle)
 
-direction_angle_hud = DirectionAngleHUD()
-power_hud = PowerHUD()
+class TrailLayer:
+    # The flight path drawn onto a transparent surface laid out like the
+    # static layer's, so each frame only draws the segments flown since the
+    # last one. It starts over when the static layer is redrawn.
+    def __init__(self):
+        self.surface = None
+        self.cache_view_port = None
+        self.flight_path = None
+        self.version = None
+        self.drawn = 0
+        self.bounds = None
+
+    def update(self, static_layer, flight_path, radius):
+        # Draws the segments flown since the last update and returns the
+        # rect of the surface that changed, or None.
+        changed = None
+        cache = static_layer.cache_view_port
+        if self.cache_view_port is not cache or self.flight_path is not flight_path or self.version != flight_path.version:
+            changed = self.bounds
+            if self.surface is None or self.surface.get_size() != static_layer.surface.get_size():
+                self.surface = pygame.Surface(static_layer.surface.get_size(), pygame.SRCALPHA)
+            self.surface.fill((0, 0, 0, 0))
+            self.cache_view_port = cache
+            self.flight_path = flight_path
+            self.version = flight_path.version
+            self.drawn = 0
+            self.bounds = None
+
+        if len(flight_path) > self.drawn:
+            # Start from the last point drawn so the new segments join on.
+            points = []
+            for index in range(max(self.drawn - 1, 0), len(flight_path)):
+                (x, y) = flight_path[index]
+                view_x = (x - cache.x) / cache.zoom + (cache.width // 2)
+                view_y = -1 * ((y - cache.y) / cache.zoom) + (cache.height // 2)
+                points.append((view_x, view_y))
+
+            view_radius = radius / cache.zoom
+            width = max(1, round(2 * view_radius))
+            if len(points) == 1:
+                drawn_rect = pygame.draw.circle(self.surface, (0, 0, 255), points[0], view_radius)
+            else:
+                # The rect draw.lines returns can fall short of thick lines' ends.
+                drawn_rect = pygame.draw.lines(self.surface, (0, 0, 255), False, points, width)
+                drawn_rect = drawn_rect.inflate(2 * width, 2 * width).clip(self.surface.get_rect())
+                if width > 2:
+                    for point in points:
+                        pygame.draw.circle(self.surface, (0, 0, 255), point, view_radius)
+
+            if self.bounds is None:
+                self.bounds = drawn_rect
+            else:
+                self.bounds = self.bounds.union(drawn_rect)
+            self.drawn = len(flight_path)
 
-background_colour = (255,255,255)
-(width, height) = (1024, 768)
-pygame.display.set_caption('Disc Golf Course Creator')
-screen = pygame.display.set_mode((width, height))
-view_port = ViewPort(width, height, screen, hole.tee_pad.x, hole.tee_pad.y, .1)
-
-font = pygame.font.SysFont('freemono', 18)
-
-score_card_hud = ScoreCardHUD()
-basket_pointer_hud = BasketPointerHUD()
-tee_pad_pointer_hud = TeePadPointerHUD()
-disc_pointer_hud = DiscPointerHUD()
-
-current_hole = 1
-holes[current_hole - 1].status = HoleStatus.CURRENT
-space_bar_down = False
-view_port_follows_disc = False
-recent_tree_hit = False
-invincible_disc_time = 0
-invincible_disc_time_limit = 0
-running = True
-clock = pygame.time.Clock()
-while running:
-    ticks = clock.tick(60)
-    
-    for event in pygame.event.get():
-        if event.type == pygame.QUIT:
-            running = False
-        elif event.type == pygame.MOUSEWHEEL:
-            if event.y > 0:
-                view_port.zoom *= 1.1
+            if changed is None:
+                changed = drawn_rect
             else:
-                view_port.zoom /= 1.1
+                changed = changed.union(drawn_rect)
 
-            if view_port.zoom < .001:
-                view_port.zoom = .001
-            elif view_port.zoom > 1:
-                view_port.zoom = 1
+        return changed
 
-        elif event.type == pygame.MOUSEMOTION:
-            if not event.buttons[0]:
-                break 
-            view_port_follows_disc = False
-            view_port.x -= event.rel[0] * view_port.zoom
-            view_port.y += event.rel[1] * view_port.zoom
-
-        elif event.type == pygame.KEYUP:
-            if event.key == pygame.K_SPACE and throw_drive.status == ThrowStatus.PLANNING:
-                power_hud.space_bar_down = False
-                throw_drive.status = ThrowStatus.FLYING
-                view_port_follows_disc = True
-                throw_drive.disc.velocity_angle = throw_drive.facing_angle + direction_angle_hud.angle
-                throw_drive.disc.velocity = 27 * (power_hud.power / 100) # 27 meters / second is about 60 miles / hour 
-
-        elif event.type == pygame.KEYDOWN:
-            if event.key == pygame.K_r:
-                view_port_follows_disc = False
-                view_port.x = 0
-                view_port.y = 0
-                throw_drive = Throw(1, Disc(0, 0, 0.12, (255, 0, 0), 7, 5, -2, 1), math.pi / 2)
+    def display(self, view_port, static_layer, flight_path, radius):
+        self.update(static_layer, flight_path, radius)
+        if self.bounds is None:
+            return
+
+        (offset_x, offset_y) = static_layer.offset(view_port)
+        view_port.screen.blit(self.surface, (offset_x + self.bounds.x, offset_y + self.bounds.y), self.bounds)
+
+
+class DirtyRectRenderer:
+    # Draws the static layer, the trail and then each element, given in
+    # drawing order as (name, key, draw) where draw() returns the rect it
+    # drew, or None, and name is its profiler phase. With dirty rects on, a
+    # frame where the view hasn't moved only redraws the elements whose key
+    # changed since the last frame, and any elements overlapping those,
+    # over the static layer and trail restored beneath them. Only those
+    # rects are pushed to the display. Otherwise the whole screen is
+    # redrawn and flipped.
+    def __init__(self, dirty_rects=True):
+        self.dirty_rects = dirty_rects
+        self.view_key = None
+        self.keys = []
+        self.rects = []
+        self.trail_layer = None
+
+    def invalidate(self):
+        self.view_key = None
+
+    def restore(self, view_port, static_layer, rect):
+        (offset_x, offset_y) = static_layer.offset(view_port)
+        area = rect.move(-offset_x, -offset_y)
+        view_port.screen.blit(static_layer.surface, rect, area)
+        view_port.screen.blit(self.trail_layer.surface, rect, area)
+
+    def draw(self, view_port, static_layer, forest, holes, throw, elements):
+        view_key = (view_port.x, view_port.y, view_port.zoom, view_port.width, view_port.height, len(elements))
+        if not self.dirty_rects or view_key != self.view_key or not static_layer.is_valid(view_port):
+            self.draw_full(view_port, static_layer, forest, holes, throw, elements)
+            self.view_key = view_key
+            return
 
-            if event.key == pygame.K_n:
+        if not self.draw_dirty(view_port, static_layer, throw, elements):
+            self.draw_full(view_port, static_layer, forest, holes, throw, elements)
+
+    def draw_full(self, view_port, static_layer, forest, holes, throw, elements):
+        with profiler.phase('static'):
+            static_layer.display(view_port, forest, holes)
+        with profiler.phase('trail'):
+            throw.trail_layer.display(view_port, static_layer, throw.flight_path, throw.disc.radius)
+        self.trail_layer = throw.trail_layer
+
+        self.keys = []
+        self.rects = []
+        for (name, key, draw) in elements:
+            with profiler.phase(name):
+                self.keys.append(key)
+                self.rects.append(draw())
+
+        with profiler.phase('flip'):
+            pygame.display.flip()
+
+    def draw_dirty(self, view_port, static_layer, throw, elements):
+        # Returns False if the frame needs a full redraw after all.
+        (offset_x, offset_y) = static_layer.offset(view_port)
+        dirty = []
+
+        # A new throw takes the last one's trail off the screen.
+        if throw.trail_layer is not self.trail_layer:
+            if self.trail_layer.bounds is not None:
+                dirty.append(self.trail_layer.bounds.move(offset_x, offset_y))
+            self.trail_layer = throw.trail_layer
+
+        with profiler.phase('trail'):
+            trail_rect = self.trail_layer.update(static_layer, throw.flight_path, throw.disc.radius)
+        if trail_rect is not None:
+            dirty.append(trail_rect.move(offset_x, offset_y))
+
+        redraw = []
+        for (index, (name, key, draw)) in enumerate(elements):
+            redraw.append(key != self.keys[index])
+            if redraw[-1] and self.rects[index] is not None:
+                dirty.append(self.rects[index])
+
+        # Restoring under an unchanged element wipes it, so it is redrawn
+        # too and everything under its rect restored, until that settles.
+        spreading = True
+        while spreading:
+            spreading = False
+            for (index, rect) in enumerate(self.rects):
+                if not redraw[index] and rect is not None and rect.collidelist(dirty) != -1:
+                    redraw[index] = True
+                    dirty.append(rect)
+                    spreading = True
+
+        screen_rect = view_port.screen.get_rect()
+        dirty = [rect.clip(screen_rect) for rect in dirty]
+        with profiler.phase('static'):
+            for rect in dirty:
+                self.restore(view_port, static_layer, rect)
+
+        for (index, (name, key, draw)) in enumerate(elements):
+            if not redraw[index]:
+                continue
+
+            with profiler.phase(name):
+                rect = draw()
+            self.keys[index] = key
+            self.rects[index] = rect
+            if rect is None:
+                continue
+
+            # Something changed size or moved under an element that is
+            # drawn on top of it but wasn't redrawn.
+            for later in range(index + 1, len(elements)):
+                if not redraw[later] and self.rects[later] is not None and rect.colliderect(self.rects[later]):
+                    return False
+
+            dirty.append(rect)
+
+        with profiler.phase('flip'):
+            pygame.display.update(dirty)
+        return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Disc Golf Course Creator')
+    parser.add_argument('--seed', type=int, help='lay out the course generated from this seed')
+    parser.add_argument('--course', help='play the course saved in this file')
+    parser.add_argument('--trees', type=int, default=10000, help='trees in the generated course')
+    parser.add_argument(
+        '--chunked',
+        type=float,
+        metavar='DENSITY',
+        help='lay trees out lazily in chunks, at this many per square metre, for courses of any size'
+    )
+    parser.add_argument('--holes', type=int, default=18, help='holes in the generated course')
+    parser.add_argument('--save-course', help='save the course being played to this file')
+    parser.add_argument('--dirty-rects', action='store_true', help='only update the parts of the screen that change')
+    parser.add_argument('--profile', help='stream per-frame timings to this .csv or .jsonl file (F3 shows them)')
+    parser.add_argument('--record', help='save a log of the round to this file for game.py to replay')
+    parser.add_argument('--rng-seed', type=int, help='seed for how discs bounce off trees')
+    parser.add_argument('--group', type=int, default=1, help='players in your group, counting you')
+    parser.add_argument('--ghosts', nargs='+', default=[], help='round logs to race the throws of')
+    parser.add_argument('--best-ghosts', type=int, help='only race the throws of the best rounds on each hole')
+    args = parser.parse_args()
+    if args.chunked is not None and (args.course is not None or args.save_course is not None):
+        parser.error('--chunked courses have no fixed set of trees to load or save')
+
+    pygame.init()
+    if args.profile is not None:
+        profiler.open_output(args.profile)
+
+    # The window opens first, and a generated course's trees are grown in
+    # the background while the first frames are drawn.
+    (width, height) = (1024, 768)
+    pygame.display.set_caption('Disc Golf Course Creator')
+    screen = pygame.display.set_mode((width, height))
+
+    generator = None
+    if args.course is not None:
+        played = load_course(args.course, tee_pad_class=TeePad, basket_class=Basket)
+        course_info = {'path': args.course, 'seed': played.seed}
+        if args.save_course is not None:
+            save_course(played, args.save_course)
+    elif args.chunked is not None:
+        played = generate_chunked_course(args.seed, args.holes, args.chunked, tee_pad_class=TeePad, basket_class=Basket)
+        course_info = {'seed': played.seed, 'n_holes': args.holes, 'tree_density': args.chunked}
+    else:
+        generator = CourseGenerator(
+            args.seed,
+            args.holes,
+            args.trees,
+            tee_pad_class=TeePad,
+            basket_class=Basket
+        ).start()
+        played = generator.course
+        course_info = {'seed': played.seed, 'n_holes': args.holes, 'n_trees': args.trees}
+
+    game_round = Round(played, args.rng_seed, throw_class=Throw, disc_class=Disc, course_info=course_info)
+    holes = played.holes
+
+    # Everyone else on the course, if anyone.
+    group = None
+    if args.group > 1 or len(args.ghosts) > 0:
+        (ghosts, skipped) = crowd.load_ghosts(args.ghosts, course_info, args.best_ghosts)
+        for path in skipped:
+            print(f'{path} was recorded on another course, so it has no ghosts here')
+        pool = DiscPool(played.forest, game_round.new_disc(0, 0))
+        group = crowd.Crowd(pool, args.group - 1, ghosts, game_round.rng_seed)
+        group.start_hole(game_round.hole())
+    static_layer = StaticLayer(tile_pyramid=TilePyramid())
+
+    hole = game_round.hole()
+
+    direction_angle_hud = DirectionAngleHUD()
+    power_hud = PowerHUD()
+    loading_hud = LoadingHUD()
+    caddie_hud = CaddieHUD(Caddie(played.forest))
+
+    view_port = ViewPort(width, height, screen, hole.tee_pad.x, hole.tee_pad.y, .1)
+
+    score_card_hud = ScoreCardHUD()
+    basket_pointer_hud = BasketPointerHUD()
+    tee_pad_pointer_hud = TeePadPointerHUD()
+    disc_pointer_hud = DiscPointerHUD()
+    renderer = DirtyRectRenderer(args.dirty_rects)
+
+    view_port_follows_disc = False
+    running = True
+    clock = pygame.time.Clock()
+    while running:
+        ticks = clock.tick(60)
+        profiler.begin_frame()
+
+        profiler.start('events')
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                running = False
+            elif event.type == pygame.MOUSEWHEEL:
+                if event.y > 0:
+                    view_port.zoom *= 1.1
+                else:
+                    view_port.zoom /= 1.1
+
+                if view_port.zoom < .001:
+                    view_port.zoom = .001
+                elif view_port.zoom > 1:
+                    view_port.zoom = 1
+
+            elif event.type == pygame.MOUSEMOTION:
+                if not event.buttons[0]:
+                    break 
                 view_port_follows_disc = False
-                view_port.x = 0
-                view_port.y = 0
-                throw_drive = Throw(1, Disc(0, 0, 0.12, (255, 0, 0), 7, 5, -2, 1), math.pi / 2)
-                basket = Basket(random.uniform(-50, 50), random.uniform(-110, -80))
-                trees = []
-                for _ in range(0, random.randint(10, 100)):
-                    x = random.uniform(-100, 100)
-                    y = random.uniform(-200, 10)
-                    radius = random.uniform(.25, 5)
-                    trees.append(Tree(x, y, radius))
-
-            elif event.key == pygame.K_SPACE:
-                power_hud.space_bar_down = True
-
-            elif event.key == pygame.K_LEFT:
-                direction_angle_hud.angle += math.pi / 64
-                if direction_angle_hud.angle > (math.pi / 2):
-                    direction_angle_hud.angle = math.pi / 2
-
-            elif event.key == pygame.K_RIGHT:
-                direction_angle_hud.angle -= math.pi / 64
-                if direction_angle_hud.angle < (-1 * math.pi / 2):
-                    direction_angle_hud.angle = -1 * math.pi / 2
- 
-    if throw_drive.status == ThrowStatus.COMPLETE:
-        view_port_follows_disc = False
-        power_hud.power = 0
-        direction_angle_hud.angle = 0
-        hole = holes[current_hole - 1]
-        facing_angle = math.atan2((hole.basket.y - throw_drive.disc.y), (hole.basket.x - throw_drive.disc.x))
-        throw_drive = Throw(throw_drive.count + 1, throw_drive.disc, facing_angle)
-
-    if view_port_follows_disc:
-        view_port.x = throw_drive.disc.x
-        view_port.y = throw_drive.disc.y
-    
-    screen.fill(background_colour)
-
-    for (index, tree) in trees.items():
-        tree.display(view_port)
-        if not recent_tree_hit and collide(throw_drive.disc, tree):
-            recent_tree_hit = True
-            invincible_disc_time_limit = random.uniform(.1, 1)
-            throw_drive.disc.velocity_angle += random.uniform(0, 2 * math.pi)
-            throw_drive.disc.velocity *= random.uniform(0, 0.9)
-
-    if recent_tree_hit:
-        if invincible_disc_time < invincible_disc_time_limit:
-            invincible_disc_time += ticks / 1000
-        else:
-            invincible_disc_time = 0
-            recent_tree_hit = False
-
-    for hole in holes:
-        hole.basket.display(view_port)
-        hole.tee_pad.display(view_port)
-
-    hole = holes[current_hole - 1]
-    if collide(throw_drive.disc, hole.basket):
-        view_port_follows_disc = False
-        power_hud.power = 0
-        direction_angle_hud.angle = 0
-        hole = holes[current_hole - 1]
-        hole.status = HoleStatus.COMPLETE
-        hole.score = throw_drive.count
-
-        current_hole += 1
-        hole = holes[current_hole - 1]
-        hole.status = HoleStatus.CURRENT
-        view_port.x = hole.tee_pad.x
-        view_port.y = hole.tee_pad.y
-        throw_drive = Throw(1, Disc(hole.tee_pad.x, hole.tee_pad.y, 0.12, (255, 0, 0), 7, 5, -2, 1), hole.tee_pad.facing_angle)
-
-    throw_drive.update(ticks)
-    throw_drive.display(view_port, direction_angle_hud.angle)
-
-    direction_angle_hud.display(view_port)
-
-    power_hud.update()
-    power_hud.display(view_port)
-
-    score_card_hud.display(view_port, holes)
-    basket_pointer_hud.display(view_port, hole)
-    tee_pad_pointer_hud.display(view_port, hole)
-    disc_pointer_hud.display(view_port, throw_drive.disc)
-
-    pygame.display.flip()
+                view_port.x -= event.rel[0] * view_port.zoom
+                view_port.y += event.rel[1] * view_port.zoom
+
+            elif event.type == pygame.KEYUP:
+                # Only a press seen after the course was ready can throw.
+                if event.key == pygame.K_SPACE and power_hud.space_bar_down:
+                    power_hud.space_bar_down = False
+                    if game_round.release(power_hud.power):
+                        view_port_follows_disc = True
+                        if group is not None and game_round.forest is played.forest:
+                            group.throw(game_round.throw.count)
+
+            elif event.type == pygame.KEYDOWN:
+                if event.key == pygame.K_r:
+                    view_port_follows_disc = False
+                    view_port.x = 0
+                    view_port.y = 0
+                    game_round.reset()
+
+                if event.key == pygame.K_n and generator is None:
+                    view_port_follows_disc = False
+                    view_port.x = 0
+                    view_port.y = 0
+                    game_round.practice(random.randrange(2 ** 32))
+                    static_layer.invalidate()
+
+                elif event.key == pygame.K_SPACE and generator is None:
+                    power_hud.space_bar_down = True
+                    game_round.press()
+
+                elif event.key == pygame.K_LEFT:
+                    game_round.turn(math.pi / 64)
+
+                elif event.key == pygame.K_RIGHT:
+                    game_round.turn(-1 * math.pi / 64)
+
+                elif event.key == pygame.K_h:
+                    caddie_hud.toggle()
+
+                elif event.key == pygame.K_F3:
+                    profiler.toggle_overlay()
+        profiler.stop()
+
+        # Trees are drawn as they come in, but nothing can be thrown or
+        # practiced until the whole course is there to play.
+        if generator is not None:
+            (grown_forest, done) = generator.poll()
+            if grown_forest is not game_round.forest:
+                game_round.set_forest(grown_forest)
+                if group is not None:
+                    group.pool.forest = grown_forest
+                static_layer.invalidate()
+                renderer.invalidate()
+            if done:
+                generator = None
+                if args.save_course is not None:
+                    save_course(played, args.save_course)
+
+        thrown = game_round.throw
+        with profiler.phase('physics'):
+            # A disc resting against a tree draws bounces every step, so the
+            # round only steps through the trees a replay will have.
+            if generator is None:
+                game_round.advance(ticks / 1000)
+            if group is not None:
+                group.advance(ticks / 1000)
+
+        # The round moved on to the next throw or hole.
+        if game_round.throw is not thrown:
+            view_port_follows_disc = False
+            power_hud.power = 0
+            if game_round.hole() is not hole:
+                hole = game_round.hole()
+                view_port.x = hole.tee_pad.x
+                view_port.y = hole.tee_pad.y
+                renderer.invalidate()
+                if group is not None:
+                    group.start_hole(hole)
+
+        # The caddie only knows the course, once it's all there.
+        if generator is None and game_round.forest is played.forest:
+            caddie_hud.update(game_round.throw, hole, game_round.forest)
+
+        throw_drive = game_round.throw
+        forest = game_round.forest
+        direction_angle_hud.angle = game_round.angle
+        alpha = game_round.alpha()
+        if view_port_follows_disc:
+            (view_port.x, view_port.y) = throw_drive.disc.interpolate(alpha)
+
+        power_hud.update()
+
+        # Keys hold everything an element's pixels depend on besides the view.
+        disc = throw_drive.disc
+        hud_angle = direction_angle_hud.angle
+        score_key = tuple((h.number, h.distance, h.par, h.score, h.status) for h in holes)
+        renderer.draw(view_port, static_layer, forest, holes, throw_drive, (
+            (
+                'player',
+                (throw_drive.starting_x, throw_drive.starting_y, throw_drive.facing_angle, hud_angle),
+                lambda: throw_drive.display_player(view_port, hud_angle)
+            ),
+            (
+                'crowd',
+                None if group is None else (group.pool.version, group.pool.any_flying() and group.pool.alpha()),
+                lambda: None if group is None else group.pool.display(view_port, group.pool.alpha())
+            ),
+            ('caddie_hud', caddie_hud.key(throw_drive), lambda: caddie_hud.display(view_port, throw_drive)),
+            ('disc', disc.interpolate(alpha), lambda: disc.display(view_port, alpha)),
+            ('direction_hud', hud_angle, lambda: direction_angle_hud.display(view_port)),
+            ('power_hud', power_hud.power, lambda: power_hud.display(view_port)),
+            ('score_card_hud', score_key, lambda: score_card_hud.display(view_port, holes)),
+            ('basket_pointer_hud', hole.number, lambda: basket_pointer_hud.display(view_port, hole)),
+            ('tee_pad_pointer_hud', hole.number, lambda: tee_pad_pointer_hud.display(view_port, hole)),
+            ('disc_pointer_hud', (disc.x, disc.y), lambda: disc_pointer_hud.display(view_port, disc)),
+            (
+                'loading_hud',
+                None if generator is None else generator.grown,
+                lambda: loading_hud.display(view_port, generator)
+            ),
+            ('profiler', profiler.overlay_key(), lambda: profiler.display(view_port))
+        ))
+        profiler.end_frame()
+
+    profiler.close()
+    if args.record is not None:
+        save_log(game_round, args.record)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,302 @@
+from array import array
+from enum import Enum
+import math
+import random
+
+
+# Velocity a flying disc keeps every 1/60th of a second.
+AIR_DRAG = 0.996
+FIXED_DT = 1 / 60
+MAX_THROW_SPEED = 27 # 27 meters / second is about 60 miles / hour
+
+
+def fade_rate(disc):
+    # Radians a second a slow disc fades by.
+    return (math.pi / 4) * .25 * ((disc.fade + 1) / 6)
+
+
+def turn_rate(disc):
+    # Radians a second a fast disc turns by.
+    return (math.pi / 4) * .25 * ((-1 * disc.turn + 2) / 7)
+
+
+class Disc:
+    def __init__(self, x, y, radius, color, speed, glide, turn, fade):
+        self.velocity_angle = 0
+        self.velocity = 0
+        self.x = x
+        self.y = y
+        self.previous_x = x
+        self.previous_y = y
+        self.radius = radius
+        self.color = color
+        self.speed = speed
+        self.glide = glide
+        self.turn = turn
+        self.fade = fade
+        self.throw_distance = 0
+
+    def interpolate(self, alpha):
+        # Position between the last two steps, for drawing between them.
+        x = self.previous_x + (self.x - self.previous_x) * alpha
+        y = self.previous_y + (self.y - self.previous_y) * alpha
+        return (x, y)
+
+    def update(self, seconds):
+        self.previous_x = self.x
+        self.previous_y = self.y
+
+        self.y += math.sin(self.velocity_angle) * self.velocity * seconds
+        self.x += math.cos(self.velocity_angle) * self.velocity * seconds
+
+        # Low velocity fade
+        if self.velocity < 10 and self.velocity > 0.1:
+            self.velocity_angle += fade_rate(self) * seconds
+
+        # High velocity turn
+        if self.velocity > 20:
+            self.velocity_angle -= turn_rate(self) * seconds
+
+        self.velocity *= AIR_DRAG ** (seconds * 60)
+
+
+class FlightPath:
+    # Points packed into one preallocated array of doubles as x0, y0, x1,
+    # y1, ... Points closer than min_spacing to the last one kept are
+    # skipped. When the array is full every other point is dropped and the
+    # spacing doubled, so a path never outgrows its capacity.
+    def __init__(self, capacity=4096, min_spacing=0):
+        self.points = array('d', bytes(16 * capacity))
+        self.capacity = capacity
+        self.min_spacing = min_spacing
+        self.count = 0
+        # Bumped whenever points already handed out are rearranged.
+        self.version = 0
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self.count
+        if index < 0 or index >= self.count:
+            raise IndexError('flight path index out of range')
+
+        return (self.points[2 * index], self.points[2 * index + 1])
+
+    def __iter__(self):
+        for index in range(self.count):
+            yield (self.points[2 * index], self.points[2 * index + 1])
+
+    def append(self, x, y):
+        if self.count > 0 and self.min_spacing > 0:
+            last_x = self.points[2 * self.count - 2]
+            last_y = self.points[2 * self.count - 1]
+            if math.hypot(x - last_x, y - last_y) < self.min_spacing:
+                return
+
+        if self.count == self.capacity:
+            self.decimate()
+
+        self.points[2 * self.count] = x
+        self.points[2 * self.count + 1] = y
+        self.count += 1
+
+    def decimate(self):
+        xs = self.points[0:2 * self.count:4]
+        ys = self.points[1:2 * self.count:4]
+        self.count = len(xs)
+        self.points[0:2 * self.count:2] = xs
+        self.points[1:2 * self.count:2] = ys
+        self.min_spacing *= 2
+        self.version += 1
+
+
+class ThrowStatus(Enum):
+    PLANNING = 1
+    FLYING = 2
+    COMPLETE = 3
+
+
+class Throw:
+    def __init__(self, count, disc, facing_angle):
+        self.count = count
+        self.disc = disc
+        self.status = ThrowStatus.PLANNING
+        # Points closer than the disc's own radius would only overlap.
+        self.flight_path = FlightPath(min_spacing=disc.radius)
+        self.distance = 0
+        self.facing_angle = facing_angle
+        self.starting_x = disc.x
+        self.starting_y = disc.y
+
+    def launch(self, angle, power):
+        self.status = ThrowStatus.FLYING
+        self.disc.velocity_angle = self.facing_angle + angle
+        self.disc.velocity = MAX_THROW_SPEED * (power / 100)
+
+    def update(self, seconds):
+        if not self.status == ThrowStatus.FLYING:
+            return
+
+        self.distance += self.disc.velocity * seconds
+
+        if self.disc.velocity < 0.5:
+            self.status = ThrowStatus.COMPLETE
+            self.disc.velocity = 0
+
+        if self.disc.velocity > 0:
+            self.flight_path.append(self.disc.x, self.disc.y)
+
+        self.disc.update(seconds)
+
+
+def collide(p1, p2):
+    dx = p1.x - p2.x
+    dy = p1.y - p2.y
+
+    distance = math.hypot(dx, dy)
+    if distance < p1.radius + p2.radius:
+        return True
+
+    return False
+
+
+def time_of_impact(p1, dx, dy, p2):
+    # The fraction of the move (dx, dy) at which p1 first touches p2, or
+    # None if it doesn't. Overlapping at the start is a hit at 0, by the
+    # same test as collide().
+    return offset_impact(p1.x - p2.x, p1.y - p2.y, p1.radius + p2.radius, dx, dy)
+
+
+def offset_impact(ox, oy, reach, dx, dy):
+    # time_of_impact() for a circle offset by (ox, oy) from one it touches
+    # within reach of.
+    if math.hypot(ox, oy) < reach:
+        return 0
+
+    a = dx * dx + dy * dy
+    b = ox * dx + oy * dy
+    if a == 0 or b >= 0:
+        return None
+
+    discriminant = b * b - a * (ox * ox + oy * oy - reach * reach)
+    if discriminant < 0:
+        return None
+
+    t = (-b - math.sqrt(discriminant)) / a
+    if t > 1:
+        return None
+
+    return max(t, 0)
+
+
+class FixedStepClock:
+    # Hands out real time as whole steps of dt. Whatever is left over is
+    # kept for the next advance, and a long stall is dropped rather than
+    # caught up on all at once.
+    def __init__(self, dt=FIXED_DT, max_frame_time=0.25):
+        self.dt = dt
+        self.max_frame_time = max_frame_time
+        self.accumulator = 0
+
+    def steps(self, seconds):
+        # Yields once for every whole step seconds brings due.
+        self.accumulator += min(seconds, self.max_frame_time)
+        while self.accumulator >= self.dt:
+            self.accumulator -= self.dt
+            yield
+
+    def alpha(self):
+        return self.accumulator / self.dt
+
+
+class FlightSimulator:
+    # Steps throws at a fixed dt, no matter how long the frames drawing them
+    # take. Whatever time is left over between steps is kept for the next
+    # advance and exposed as alpha so drawing can interpolate.
+    def __init__(self, forest, rng=None, dt=FIXED_DT, max_frame_time=0.25):
+        self.forest = forest
+        self.rng = rng if rng is not None else random.Random()
+        self.dt = dt
+        self.clock = FixedStepClock(dt, max_frame_time)
+        self.recent_tree_hit = False
+        self.invincible_disc_time = 0
+        self.invincible_disc_time_limit = 0
+
+    def alpha(self):
+        return self.clock.alpha()
+
+    def step(self, throw, basket):
+        # Returns True when the disc is in the basket. The move is swept
+        # against the trees and the basket, so a fast disc can't pass
+        # through either between steps, and whichever it reaches first wins.
+        disc = throw.disc
+        (start_x, start_y) = (disc.x, disc.y)
+        remaining = self.dt
+
+        while True:
+            (dx, dy) = (0, 0)
+            if throw.status == ThrowStatus.FLYING and disc.velocity >= 0.5:
+                dx = math.cos(disc.velocity_angle) * disc.velocity * remaining
+                dy = math.sin(disc.velocity_angle) * disc.velocity * remaining
+
+            tree_hit = None
+            if not self.recent_tree_hit:
+                tree_hit = self.forest.first_swept_hit(disc, dx, dy)
+
+            basket_t = time_of_impact(disc, dx, dy, basket)
+            if basket_t is not None and (tree_hit is None or basket_t <= tree_hit[0]):
+                if basket_t > 0:
+                    throw.update(basket_t * remaining)
+                return True
+
+            if tree_hit is None:
+                throw.update(remaining)
+                break
+
+            if tree_hit[0] > 0:
+                throw.update(tree_hit[0] * remaining)
+                remaining -= tree_hit[0] * remaining
+
+            self.recent_tree_hit = True
+            self.invincible_disc_time_limit = self.rng.uniform(.1, 1)
+            disc.velocity_angle += self.rng.uniform(0, 2 * math.pi)
+            disc.velocity *= self.rng.uniform(0, 0.9)
+
+        if self.recent_tree_hit:
+            if self.invincible_disc_time < self.invincible_disc_time_limit:
+                self.invincible_disc_time += self.dt
+            else:
+                self.invincible_disc_time = 0
+                self.recent_tree_hit = False
+
+        # Interpolation spans the whole step, not its last piece.
+        disc.previous_x = start_x
+        disc.previous_y = start_y
+        return False
+
+    def advance(self, throw, basket, seconds):
+        for _ in self.clock.steps(seconds):
+            if self.step(throw, basket):
+                return True
+
+        return False
+
+    def run(self, throw, basket, max_seconds=120):
+        # Steps the throw until it stops or lands in the basket, as fast as
+        # the CPU allows.
+        for _ in range(math.ceil(max_seconds / self.dt)):
+            if self.step(throw, basket):
+                return True
+            if not throw.status == ThrowStatus.FLYING:
+                break
+
+        return False
+
+
+def simulate_throw(disc, facing_angle, angle, power, forest, basket, rng=None):
+    throw = Throw(1, disc, facing_angle)
+    throw.launch(angle, power)
+    in_basket = FlightSimulator(forest, rng).run(throw, basket)
+    return (throw, in_basket)
@@ -0,0 +1,236 @@
+from collections import deque
+import csv
+import json
+import time
+
+import pygame
+
+
+DRAW_FUNCTIONS = ('aaline', 'aalines', 'arc', 'circle', 'ellipse', 'line', 'lines', 'polygon', 'rect')
+SURFACE_FUNCTIONS = ('chop', 'flip', 'rotate', 'rotozoom', 'scale', 'scale2x', 'scale_by', 'smoothscale', 'smoothscale_by')
+
+
+def percentile(ordered, fraction):
+    # Nearest rank on an already sorted list.
+    if len(ordered) == 0:
+        return 0
+
+    return ordered[min(len(ordered) - 1, max(0, round(fraction * len(ordered)) - 1))]
+
+
+class Phase:
+    # Times one phase of a frame as a with block. Time spent in phases
+    # nested inside it is only counted against those.
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.profiler.start(self.name)
+
+    def __exit__(self, *exc_info):
+        self.profiler.stop()
+
+
+class NoPhase:
+    def __enter__(self):
+        pass
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+class FrameProfiler:
+    # Opt-in timing for the main loop. Each frame is split into the named
+    # phases, in exclusive time, and whatever no phase covers is 'other'.
+    # Once installed, pygame's draw functions and anything that makes a new
+    # surface are wrapped to count draw calls and surface allocations per
+    # frame. The last window frames are kept for rolling p50/p95/p99.
+    def __init__(self, phases, window=300, overlay_interval=15):
+        self.phases = tuple(phases)
+        self.window = window
+        self.overlay_interval = overlay_interval
+        self.enabled = False
+        self.overlay_visible = False
+        self.installed = False
+        self.surface_class = pygame.Surface
+
+        self.frame = 0
+        self.frame_start = None
+        self.stack = []
+        self.times = dict.fromkeys(self.phases, 0)
+        self.draw_calls = 0
+        self.surfaces = 0
+        self.last_counts = (0, 0)
+        self.history = {name: deque(maxlen=window) for name in self.phases + ('other', 'total')}
+
+        self.output_file = None
+        self.writer = None
+        self.overlay = None
+        self.font = None
+
+    def install(self):
+        # Draw calls made through pygame.draw and new surfaces from
+        # pygame.Surface or pygame.transform are counted. Blits and text
+        # rendering happen inside pygame's own types and aren't.
+        if self.installed:
+            return
+
+        profiler = self
+
+        def counted(function, counter):
+            def wrapper(*args, **kwargs):
+                setattr(profiler, counter, getattr(profiler, counter) + 1)
+                return function(*args, **kwargs)
+            return wrapper
+
+        for name in DRAW_FUNCTIONS:
+            setattr(pygame.draw, name, counted(getattr(pygame.draw, name), 'draw_calls'))
+        for name in SURFACE_FUNCTIONS:
+            if hasattr(pygame.transform, name):
+                setattr(pygame.transform, name, counted(getattr(pygame.transform, name), 'surfaces'))
+
+        class CountedSurface(self.surface_class):
+            def __init__(self, *args, **kwargs):
+                profiler.surfaces += 1
+                super().__init__(*args, **kwargs)
+
+        pygame.Surface = CountedSurface
+        self.installed = True
+
+    def enable(self):
+        self.install()
+        self.enabled = True
+
+    def toggle_overlay(self):
+        self.overlay_visible = not self.overlay_visible
+        if self.overlay_visible:
+            self.enable()
+        elif self.output_file is None:
+            self.enabled = False
+
+    def open_output(self, path):
+        # CSV if the path ends in .csv, otherwise one JSON object per line.
+        self.enable()
+        self.output_file = open(path, 'w', newline='')
+        if path.endswith('.csv'):
+            self.writer = csv.writer(self.output_file)
+            self.writer.writerow(self.columns())
+
+    def close(self):
+        if self.output_file is not None:
+            self.output_file.close()
+            self.output_file = None
+            self.writer = None
+
+    def columns(self):
+        names = ['frame', 'total_ms', 'p50_ms', 'p95_ms', 'p99_ms']
+        names += [f'{name}_ms' for name in self.phases + ('other',)]
+        return names + ['draw_calls', 'surfaces']
+
+    def phase(self, name):
+        if not self.enabled:
+            return NoPhase()
+
+        return Phase(self, name)
+
+    def start(self, name):
+        if not self.enabled:
+            return
+
+        self.stack.append([name, time.perf_counter(), 0])
+
+    def stop(self):
+        if not self.enabled or len(self.stack) == 0:
+            return
+
+        (name, started, nested) = self.stack.pop()
+        elapsed = time.perf_counter() - started
+        self.times[name] += elapsed - nested
+        if len(self.stack) > 0:
+            self.stack[-1][2] += elapsed
+
+    def begin_frame(self):
+        self.frame += 1
+        self.stack.clear()
+        self.times = dict.fromkeys(self.phases, 0)
+        self.draw_calls = 0
+        self.surfaces = 0
+        self.frame_start = time.perf_counter() if self.enabled else None
+
+    def end_frame(self):
+        if not self.enabled or self.frame_start is None:
+            return
+
+        total = time.perf_counter() - self.frame_start
+        for (name, seconds) in self.times.items():
+            self.history[name].append(seconds)
+        self.history['other'].append(max(total - sum(self.times.values()), 0))
+        self.history['total'].append(total)
+        self.last_counts = (self.draw_calls, self.surfaces)
+
+        if self.output_file is not None:
+            self.write_frame()
+
+    def percentiles(self, name):
+        ordered = sorted(self.history[name])
+        return tuple(percentile(ordered, fraction) * 1000 for fraction in (.5, .95, .99))
+
+    def write_frame(self):
+        values = [self.frame, self.history['total'][-1] * 1000]
+        values += self.percentiles('total')
+        values += [self.history[name][-1] * 1000 for name in self.phases + ('other',)]
+        values += [self.draw_calls, self.surfaces]
+
+        if self.writer is not None:
+            self.writer.writerow(values)
+        else:
+            self.output_file.write(json.dumps(dict(zip(self.columns(), values))) + '\n')
+
+    def overlay_key(self):
+        # Changes whenever the overlay is redrawn, for the dirty rect renderer.
+        if not self.overlay_visible:
+            return None
+
+        return self.frame // self.overlay_interval
+
+    def render_overlay(self):
+        if self.font is None:
+            self.font = pygame.font.SysFont('freemono', 14)
+
+        rows = [('phase', 'last', 'p50', 'p95', 'p99')]
+        for name in ('total',) + self.phases + ('other',):
+            if len(self.history[name]) == 0:
+                continue
+            values = (self.history[name][-1] * 1000,) + self.percentiles(name)
+            rows.append((name,) + tuple(f'{value:.2f}' for value in values))
+
+        # Cells are laid out one by one, since the font may not be monospaced.
+        white = (255, 255, 255)
+        rendered = [[self.font.render(cell, True, white) for cell in row] for row in rows]
+        counts = self.font.render(f'draw calls {self.last_counts[0]}  surfaces {self.last_counts[1]}', True, white)
+        widths = [max(row[column].get_width() for row in rendered) + 10 for column in range(len(rows[0]))]
+        line_height = self.font.get_linesize()
+
+        width = max(sum(widths), counts.get_width()) + 10
+        height = (len(rendered) + 1) * line_height + 10
+        # Made with pygame's own Surface so the overlay isn't counted.
+        self.overlay = self.surface_class((width, height), pygame.SRCALPHA)
+        self.overlay.fill((0, 0, 0, 170))
+        for (row_index, row) in enumerate(rendered):
+            top = 5 + row_index * line_height
+            right = 5 + widths[0]
+            self.overlay.blit(row[0], (5, top))
+            for (column, cell) in enumerate(row[1:], 1):
+                right += widths[column]
+                self.overlay.blit(cell, (right - 10 - cell.get_width(), top))
+        self.overlay.blit(counts, (5, 5 + len(rendered) * line_height))
+
+    def display(self, view_port):
+        if not self.overlay_visible:
+            return None
+
+        if self.overlay is None or self.frame % self.overlay_interval == 0:
+            self.render_overlay()
+
+        return view_port.screen.blit(self.overlay, (view_port.width - self.overlay.get_width() - 10, 130))
@@ -0,0 +1,49 @@
+import pytest
+
+from course import generate_course, load_course, save_course
+
+
+def holes(course):
+    return [(h.tee_pad.x, h.tee_pad.y, h.tee_pad.facing_angle, h.basket.x, h.basket.y) for h in course.holes]
+
+
+def assert_same_course(saved, loaded):
+    assert loaded.seed == saved.seed
+    assert [float(value).hex() for hole in holes(loaded) for value in hole] == \
+        [float(value).hex() for hole in holes(saved) for value in hole]
+
+    (a, b) = (saved.forest, loaded.forest)
+    for name in ('x', 'y', 'radius'):
+        assert getattr(b, name).astype('<f8').tobytes() == getattr(a, name).astype('<f8').tobytes()
+    assert b.cell_start.astype('<i8').tobytes() == a.cell_start.astype('<i8').tobytes()
+    for name in ('cell_size', 'cell_left', 'cell_bottom', 'columns', 'rows', 'max_radius'):
+        assert getattr(b, name) == getattr(a, name)
+
+
+@pytest.mark.parametrize('n_trees', [0, 1, 2000])
+def test_save_and_load_round_trip(tmp_path, n_trees):
+    course = generate_course(seed=3, n_holes=4, n_trees=n_trees)
+    save_course(course, tmp_path / 'course.bin')
+    loaded = load_course(tmp_path / 'course.bin')
+    assert_same_course(course, loaded)
+
+    # Saving what was loaded writes the same file again.
+    save_course(loaded, tmp_path / 'again.bin')
+    assert (tmp_path / 'again.bin').read_bytes() == (tmp_path / 'course.bin').read_bytes()
+
+
+def test_save_over_the_file_a_course_was_loaded_from(tmp_path):
+    path = tmp_path / 'course.bin'
+    save_course(generate_course(seed=3, n_holes=4, n_trees=2000), path)
+    loaded = load_course(path)
+    other = generate_course(seed=4, n_holes=2, n_trees=500)
+
+    # The course still reads the file it was mapped from, and the new one
+    # is in its place.
+    save_course(other, path)
+    assert_same_course(generate_course(seed=3, n_holes=4, n_trees=2000), loaded)
+    assert_same_course(other, load_course(path))
+
+    save_course(loaded, path)
+    assert_same_course(loaded, load_course(path))
+    assert list(tmp_path.iterdir()) == [path]
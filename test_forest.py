@@ -0,0 +1,122 @@
+import math
+import random
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from forest import ChunkedForest, Forest
+from physics import Disc, time_of_impact
+
+
+def new_disc(x, y, radius=.12):
+    return Disc(x, y, radius, (255, 0, 0), 7, 5, -2, 1)
+
+
+def brute_force(x, y, radius, disc, dx, dy):
+    # The first tree hit, as (t, index), by testing every tree in order.
+    hit = None
+    for (index, tree) in enumerate(zip(x, y, radius)):
+        t = time_of_impact(disc, dx, dy, SimpleNamespace(x=tree[0], y=tree[1], radius=tree[2]))
+        if t is not None and (hit is None or t < hit[0]):
+            hit = (t, index)
+
+    return hit
+
+
+def moves(seed, bounds, count, margin=30):
+    # Discs of a few sizes on and around the trees, off the grid on every
+    # side, moving every way by up to a few cells, some not at all.
+    rng = random.Random(seed)
+    (left, bottom, right, top) = bounds
+    for _ in range(count):
+        disc = new_disc(
+            rng.uniform(left - margin, right + margin),
+            rng.uniform(bottom - margin, top + margin),
+            rng.choice([.12, .5, 3])
+        )
+        length = rng.choice([0, rng.uniform(0, 1), rng.uniform(0, 40)])
+        angle = rng.uniform(0, 2 * math.pi)
+        yield (disc, length * math.cos(angle), length * math.sin(angle))
+
+
+@pytest.mark.parametrize('cell_size', [1, 10, 50])
+def test_first_swept_hit_matches_brute_force(cell_size):
+    rng = np.random.default_rng(cell_size)
+    forest = Forest(rng.uniform(0, 100, 300), rng.uniform(-50, 50, 300), rng.uniform(.25, 5, 300), cell_size)
+    (x, y, radius) = (forest.x.tolist(), forest.y.tolist(), forest.radius.tolist())
+
+    hits = 0
+    for (disc, dx, dy) in moves(cell_size, (0, -50, 100, 50), 1000):
+        expected = brute_force(x, y, radius, disc, dx, dy)
+        assert forest.first_swept_hit(disc, dx, dy) == expected
+        hits += expected is not None
+    assert hits > 50
+
+
+def test_impacts_match_brute_force():
+    rng = np.random.default_rng(1)
+    forest = Forest(rng.uniform(0, 100, 300), rng.uniform(-50, 50, 300), rng.uniform(.25, 5, 300))
+    (x, y, radius) = (forest.x.tolist(), forest.y.tolist(), forest.radius.tolist())
+
+    (discs, dx, dy) = zip(*moves(1, (0, -50, 100, 50), 1000))
+    discs = [new_disc(disc.x, disc.y) for disc in discs]
+    expected = [brute_force(x, y, radius, disc, a, b) for (disc, a, b) in zip(discs, dx, dy)]
+    impacts = forest.impacts(
+        np.array([disc.x for disc in discs]), np.array([disc.y for disc in discs]), np.array(dx), np.array(dy), .12
+    )
+    assert impacts.tolist() == [math.inf if hit is None else hit[0] for hit in expected]
+
+
+@pytest.mark.parametrize('x, y', [(55, 200), (55, -200), (-200, 25), (200, 25), (-200, -200), (200, 200)])
+def test_discs_off_the_grid(x, y):
+    forest = Forest([0, 50], [0, 50], [1, 1])
+    assert forest.first_swept_hit(new_disc(x, y), .1, .1) is None
+    (disc_x, disc_y, move) = (np.full(1, float(x)), np.full(1, float(y)), np.full(1, .1))
+    impacts = forest.impacts(disc_x, disc_y, move, move, .12)
+    assert impacts.tolist() == [math.inf]
+
+    # And onto the grid from off it, through the origin.
+    hit = forest.first_swept_hit(new_disc(x, y), -x, -y)
+    assert hit is not None
+    assert hit == brute_force([0, 50], [0, 50], [1, 1], new_disc(x, y), -x, -y)
+
+
+def test_empty_forest():
+    forest = Forest([], [], [])
+    assert forest.first_swept_hit(new_disc(0, 0), 1, 1) is None
+    assert forest.impacts(np.zeros(1), np.zeros(1), np.ones(1), np.ones(1), .12).tolist() == [math.inf]
+
+
+def flattened(chunked, bounds):
+    # One Forest of every tree in the chunks over bounds.
+    chunks = [chunk for (_, chunk) in chunked.chunks_in(*bounds)]
+    return Forest(*(np.concatenate([getattr(chunk, name) for chunk in chunks]) for name in ('x', 'y', 'radius')))
+
+
+@pytest.mark.parametrize('memory_budget', [64 * 1024 * 1024, 0])
+def test_chunked_forest_matches_flat_forest(memory_budget):
+    # Small chunks, so moves cross from chunk to chunk, either side of 0.
+    # With no memory budget chunks are dropped and laid out again as the
+    # test goes.
+    chunked = ChunkedForest(7, .02, chunk_size=32, memory_budget=memory_budget)
+    bounds = (-80, -80, 80, 80)
+    flat = flattened(chunked, (-200, -200, 200, 200))
+
+    (discs, dx, dy) = zip(*moves(2, bounds, 1000))
+    discs = [new_disc(disc.x, disc.y) for disc in discs]
+    (x, y) = (np.array([disc.x for disc in discs]), np.array([disc.y for disc in discs]))
+    impacts = chunked.impacts(x, y, np.array(dx), np.array(dy), .12)
+    assert impacts.tolist() == flat.impacts(x, y, np.array(dx), np.array(dy), .12).tolist()
+    assert np.isfinite(impacts).sum() > 50
+
+    for (disc, a, b) in zip(discs, dx, dy):
+        hit = chunked.first_swept_hit(disc, a, b)
+        expected = flat.first_swept_hit(disc, a, b)
+        assert (hit is None) == (expected is None)
+        if hit is not None:
+            # Trees hit at the same time may be told apart differently.
+            ((chunk_x, chunk_y), index) = hit[1]
+            chunk = chunked.chunk(chunk_x, chunk_y)
+            tree = SimpleNamespace(x=chunk.x[index], y=chunk.y[index], radius=chunk.radius[index])
+            assert hit[0] == expected[0] == time_of_impact(disc, a, b, tree)
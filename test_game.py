@@ -0,0 +1,58 @@
+import random
+
+from course import generate_course
+from game import Round, load_log, matches, replay, save_log
+from physics import ThrowStatus
+
+
+def play(game_round, seed, frames, practice_frame):
+    # Throws at random angles and powers with frames of random lengths,
+    # some long enough to be cut short, moving to a practice area part way
+    # through. Returns how many frames had a tree hit in them on the course
+    # and in the practice area.
+    rng = random.Random(seed)
+    tree_hits = {'course': 0, 'practice': 0}
+    for frame in range(frames):
+        if frame == practice_frame:
+            game_round.practice(rng.randrange(1000))
+
+        if game_round.throw.status == ThrowStatus.PLANNING:
+            if game_round.space_bar_down:
+                if rng.random() < .2:
+                    game_round.release(rng.uniform(40, 100))
+            elif rng.random() < .3:
+                game_round.turn(rng.uniform(-.3, .3))
+            elif rng.random() < .3:
+                game_round.press()
+
+        # Tree hits draw from the round's generator.
+        state = game_round.simulator.rng.getstate()
+        game_round.advance(rng.choice([rng.uniform(.001, .05), rng.uniform(.05, .4)]))
+        if state != game_round.simulator.rng.getstate():
+            tree_hits['course' if game_round.forest is game_round.course.forest else 'practice'] += 1
+
+    return tree_hits
+
+
+def record(tmp_path, frames=1500, practice_frame=900):
+    game_round = Round(generate_course(seed=5, n_holes=2, n_trees=3000), rng_seed=9)
+    tree_hits = play(game_round, 3, frames, practice_frame)
+    path = tmp_path / 'round.json'
+    save_log(game_round, path)
+    return (load_log(path), tree_hits)
+
+
+def test_replay_matches_recording(tmp_path):
+    (log, tree_hits) = record(tmp_path)
+    assert tree_hits['course'] > 0
+    assert tree_hits['practice'] > 0
+    assert 'practice' in [entry[1] for entry in log['inputs']]
+    assert len({entry[0] for entry in log['inputs']}) > 10
+    assert matches(log, replay(log))
+
+
+def test_replay_notices_a_changed_throw(tmp_path):
+    (log, _) = record(tmp_path)
+    release = [entry for entry in log['inputs'] if entry[1] == 'release'][-1]
+    release[2] += 1
+    assert not matches(log, replay(log))
@@ -0,0 +1,82 @@
+import os
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+import numpy as np
+import pygame
+import pytest
+
+from main import TreeRasterizer
+
+
+WIDTH = 320
+HEIGHT = 240
+
+
+def draw(vectorized, depth, x, y, radius, clip=None):
+    surface = pygame.Surface((WIDTH, HEIGHT), 0, depth)
+    surface.fill((255, 255, 255))
+    if clip is not None:
+        surface.set_clip(clip)
+    TreeRasterizer(vectorized=vectorized).draw(surface, (0, 255, 0), x, y, radius)
+    return pygame.surfarray.array2d(surface)
+
+
+def assert_same_pixels(x, y, radius, depth, clip=None):
+    stamped = draw(True, depth, x, y, radius, clip)
+    circles = draw(False, depth, x, y, radius, clip)
+    assert np.count_nonzero(stamped != circles) == 0
+
+
+def trees(zoom, seed, count=400):
+    # Trees of course sizes seen at zoom, with centers off the pixel grid
+    # and some hanging over every edge.
+    rng = np.random.default_rng(seed)
+    x = rng.uniform(-20, WIDTH + 20, count)
+    y = rng.uniform(-20, HEIGHT + 20, count)
+    radius = rng.uniform(.25, 5, count) / zoom
+    return (x, y, radius)
+
+
+@pytest.mark.parametrize('depth', [8, 16, 24, 32])
+@pytest.mark.parametrize('zoom', [.05, .1, .25, .5, 1, 2, 3.3])
+def test_stamped_trees_match_pygame(depth, zoom):
+    assert_same_pixels(*trees(zoom, seed=int(zoom * 100)), depth)
+
+
+@pytest.mark.parametrize('depth', [8, 16, 24, 32])
+@pytest.mark.parametrize('offset', [0, .25, .5, .75, .999])
+def test_sub_pixel_centers_and_radii(depth, offset):
+    # Every whole radius up to past max_radius at the same fraction of a
+    # pixel, in a row clear of the edges.
+    radius = np.arange(1, 12) + offset
+    x = 20 + np.arange(len(radius)) * 26 + offset
+    y = np.full(len(radius), 60 + offset)
+    assert_same_pixels(x, y, radius, depth)
+
+
+@pytest.mark.parametrize('depth', [8, 16, 24, 32])
+def test_circles_on_the_edges(depth):
+    # Circles just inside, touching and crossing each edge of the surface.
+    (x, y, radius) = ([], [], [])
+    for size in (1, 3, 8):
+        for gap in (-size - 1, -size, 0, size - 1, size, size + 1):
+            x += [gap, WIDTH - 1 - gap, WIDTH / 2, WIDTH / 2]
+            y += [HEIGHT / 2, HEIGHT / 2, gap, HEIGHT - 1 - gap]
+            radius += [size + .5] * 4
+    assert_same_pixels(np.array(x, dtype=float), np.array(y, dtype=float), np.array(radius), depth)
+
+
+@pytest.mark.parametrize('depth', [8, 16, 24, 32])
+@pytest.mark.parametrize('zoom', [.1, .5, 2])
+def test_clipped_surface(depth, zoom):
+    assert_same_pixels(*trees(zoom, seed=7), depth, clip=pygame.Rect(40, 30, 200, 150))
+
+
+def test_radii_past_max_radius_are_drawn():
+    x = np.array([60.5, 160.5])
+    y = np.array([120.5, 120.5])
+    radius = np.array([20.5, 40.5])
+    assert_same_pixels(x, y, radius, 32)
+    # Not left blank by the stamping path.
+    assert np.count_nonzero(draw(True, 32, x, y, radius) != draw(True, 32, x[:0], y[:0], radius[:0])) > 0